@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Compare speed of JSON encoders and binary formats from `extra_cbv.encoders`
+registry on the payloads of the typical and the numeric list views:
+
+    python benchmarks/encoders.py [objects count]
+"""
+import datetime
+import decimal
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # NOQA
+settings.configure()
+
+from extra_cbv import encoders  # NOQA
+
+
+def get_payload(count):
+    now = datetime.datetime(2017, 5, 1, 12, 30, 15, 123456)
+    return {
+        'pagination': {'next': 2, 'previous': None, 'count': 100},
+        'object_list': [{
+            'pk': pk,
+            'uuid': uuid.UUID(int=pk),
+            'title': u'Object #%d' % pk,
+            'price': decimal.Decimal('%d.99' % pk),
+            'rating': pk / 7.0,
+            'is_active': bool(pk % 2),
+            'created': now,
+            'date': now.date(),
+            'tags': [1, 2, 3],
+        } for pk in range(count)]
+    }
+
+
+def get_numeric_payload(count):
+    return {
+        'object_list': [{
+            'pk': pk,
+            'x': pk * 0.25,
+            'y': pk * 1.5,
+            'count': pk * 3,
+            'values': [pk, pk + 1, pk + 2, pk + 3],
+        } for pk in range(count)]
+    }
+
+
+def measure(name, dumps, payload):
+    number = 10
+    seconds = timeit.timeit(lambda: dumps(payload), number=number)
+    print('%-24s %8.1f ms %10d bytes' % (
+        name, seconds / number * 1000, len(dumps(payload))))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for title, payload in (('typical', get_payload(count)),
+                           ('numeric', get_numeric_payload(count))):
+        print('%d %s objects' % (count, title))
+        for name in sorted(encoders.ENCODERS):
+            if not encoders.is_available(name):
+                print('%-24s not installed' % name)
+                continue
+            measure(name, encoders.get_encoder(name), payload)
+        for media_type in sorted(encoders.MEDIA_TYPES):
+            if not encoders.is_media_type_available(media_type):
+                print('%-24s not installed' % media_type)
+                continue
+            measure(media_type,
+                    encoders.get_media_type_encoder(media_type), payload)
+
+
+if __name__ == '__main__':
+    main()
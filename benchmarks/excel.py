@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Compare per cell writing of the wide exports by the column schema of
+`extra_cbv.views.excel` with the per value type checks it replaced:
+
+    python benchmarks/excel.py [rows count]
+"""
+import StringIO
+import datetime
+import decimal
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # NOQA
+settings.configure()
+
+from extra_cbv.views.excel import Column, ColumnSchema, get_xls_workbook  # NOQA
+
+# groups of columns repeated to get the wide table
+COLUMNS_REPEAT = 4
+
+
+def get_table(count):
+    # columns are described like `Column.for_field` describes model fields
+    now = datetime.datetime(2017, 5, 1, 12, 30, 15)
+    columns = [
+        Column('pk', style='default', quoted=False),
+        Column('title', style='default'),
+        Column('price', style='default', quoted=False),
+        Column('created', style='datetime', quoted=False),
+        Column('date', style='date', quoted=False),
+    ] * COLUMNS_REPEAT
+    rows = [[pk, u'Object "%d"' % pk, decimal.Decimal('%d.99' % pk), now,
+             now.date()] * COLUMNS_REPEAT for pk in range(count)]
+    headers = [column.name for column in columns]
+    return ColumnSchema(columns, headers), rows
+
+
+def legacy_csv(schema, rows):
+    output = StringIO.StringIO()
+    for row in [schema.headers] + rows:
+        out_row = []
+        for value in row:
+            if not isinstance(value, basestring):
+                value = unicode(value)
+            value = value.encode('utf8')
+            out_row.append(value.replace('"', '""'))
+        output.write('"%s"\n' % '","'.join(out_row))
+    return output.getvalue()
+
+
+def schema_csv(schema, rows):
+    output = StringIO.StringIO()
+    for chunk in schema.iter_csv(rows):
+        output.write(chunk)
+    return output.getvalue()
+
+
+def legacy_cells(schema, rows, styles):
+    cells = []
+    for row in rows:
+        for value in row:
+            if isinstance(value, datetime.datetime):
+                cell_style = styles['datetime']
+            elif isinstance(value, datetime.date):
+                cell_style = styles['date']
+            elif isinstance(value, datetime.time):
+                cell_style = styles['time']
+            else:
+                cell_style = styles['default']
+            cells.append((value, cell_style))
+    return cells
+
+
+def schema_cells(schema, rows, styles):
+    cells = []
+    for row in schema.iter_cells(rows, styles):
+        cells.extend(row)
+    return cells
+
+
+def measure(name, func, cells_count):
+    number = 5
+    seconds = timeit.timeit(func, number=number) / number
+    print('%-16s %8.1f ms %8.0f ns/cell' % (
+        name, seconds * 1000, seconds / cells_count * 1e9))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    schema, rows = get_table(count)
+    cells_count = count * len(schema.columns)
+    assert legacy_csv(schema, rows) == schema_csv(schema, rows)
+    book, styles = get_xls_workbook()
+    print('%d rows x %d columns' % (count, len(schema.columns)))
+    measure('legacy csv', lambda: legacy_csv(schema, rows), cells_count)
+    measure('schema csv', lambda: schema_csv(schema, rows), cells_count)
+    measure('legacy cells', lambda: legacy_cells(schema, rows, styles),
+            cells_count)
+    measure('schema cells', lambda: schema_cells(schema, rows, styles),
+            cells_count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# coding: utf-8
+"""
+Set based actions on the selected objects of `MassActionMixin`
+"""
+import json
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils.encoding import force_bytes
+
+from . import jobs
+from .cache import mark_model_changed
+
+
+# number of objects changed by one query in one transaction
+ACTION_CHUNK_SIZE = 500
+
+
+def clean_pks(model, values):
+    """
+    Return list of unique valid pks of the model from the request values
+    """
+    field = model._meta.pk
+    pks = []
+    seen = set()
+    for value in values:
+        try:
+            pk = field.to_python(value)
+        except ValidationError:
+            continue
+        if pk is not None and pk not in seen:
+            seen.add(pk)
+            pks.append(pk)
+    return pks
+
+
+class BulkAction(object):
+    """
+    Action which processes the selected objects by chunks of
+    `chunk_size` pks, every chunk is processed by `process(queryset)`
+    in its own transaction. Pks outside of the view queryset are skipped.
+
+    Update queries send no signals, so the version of the model data
+    (see `extra_cbv.cache`) is changed after every processed chunk.
+
+    Instances can be used as actions of `MassActionMixin`.
+    """
+    chunk_size = ACTION_CHUNK_SIZE
+
+    def __init__(self, chunk_size=None):
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    def __call__(self, view, queryset):
+        return self.run(queryset, list(queryset.values_list('pk', flat=True)))
+
+    def run(self, queryset, pks, progress=None):
+        """
+        Process objects of the queryset with `pks`, `progress(done, total)`
+        is called after every chunk. Return number of processed objects.
+        """
+        total = len(pks)
+        done = processed = 0
+        for i in range(0, total, self.chunk_size):
+            chunk = pks[i:i + self.chunk_size]
+            with transaction.atomic(using=queryset.db):
+                count = self.process(queryset.filter(pk__in=chunk))
+            if count:
+                mark_model_changed(queryset.model, queryset.db)
+            processed += count
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+        return processed
+
+    def process(self, queryset):
+        """
+        Process the chunk of objects and return number of processed objects
+        """
+        raise NotImplementedError('You must override `process` method in '
+                                  'child action')
+
+
+class UpdateAction(BulkAction):
+    """
+    Set `values` of the fields by `update()` query
+    """
+
+    def __init__(self, chunk_size=None, **values):
+        super(UpdateAction, self).__init__(chunk_size)
+        self.values = values
+
+    def process(self, queryset):
+        return queryset.update(**self.values)
+
+
+class DeleteAction(BulkAction):
+
+    def process(self, queryset):
+        deleted, counts = queryset.delete()
+        return counts.get(queryset.model._meta.label, 0)
+
+
+class BulkUpdateAction(BulkAction):
+    """
+    Change loaded objects by `update_object(obj)` and save `fields` of the
+    chunk by one `UPDATE ... CASE` query (`bulk_update` is used when it is
+    available)
+    """
+    fields = []
+
+    def update_object(self, obj):
+        raise NotImplementedError('You must override `update_object` method '
+                                  'in child action')
+
+    def process(self, queryset):
+        if not self.fields:
+            raise ImproperlyConfigured(u'You must define `fields` saved by '
+                                       '%s' % self.__class__.__name__)
+        objects = list(queryset.select_for_update())
+        for obj in objects:
+            self.update_object(obj)
+        if not objects:
+            return 0
+        if hasattr(queryset, 'bulk_update'):
+            queryset.bulk_update(objects, self.fields)
+            return len(objects)
+
+        meta = queryset.model._meta
+        values = {}
+        for name in self.fields:
+            field = meta.get_field(name)
+            values[field.name] = Case(*[
+                When(pk=obj.pk, then=Value(getattr(obj, field.attname)))
+                for obj in objects], output_field=field)
+        queryset.filter(pk__in=[obj.pk for obj in objects]).update(**values)
+        return len(objects)
+
+
+def run_action_job(store, key, job_id, action, queryset, pks):
+    def progress(done, total):
+        store.update(job_id, done=done, total=total)
+
+    def build(output):
+        processed = action.run(queryset, pks, progress)
+        store.update(job_id, processed=processed)
+        output.write(force_bytes(json.dumps({'processed': processed})))
+
+    jobs.run_job(store, key, job_id, build)
+
+
+def start_action_job(store, backend, key, action, queryset, pks, **meta):
+    """
+    Run the action in the background job or return active job with the
+    same `key`. Return (job_id, meta) tuple.
+    """
+    job_id, created = store.create(key, total=len(pks), done=0, **meta)
+    if created:
+        backend.submit(run_action_job, store, key, job_id, action, queryset,
+                       pks)
+    return job_id, store.get(job_id)
@@ -0,0 +1,261 @@
+# coding: utf-8
+"""
+Caches of the generated files and versions of the models data
+"""
+import errno
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.encoding import force_bytes
+
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+
+def get_queryset_key(queryset, *extra):
+    """
+    Return cache key of the queryset results by its compiled SQL and
+    params, `extra` values are added to the key as is
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        sql, params = None, ()
+    return repr((queryset.db, sql, tuple(params)) + extra)
+
+
+class FileCache(object):
+    """
+    Size bounded cache of files in the directory.
+
+    Every access sets the access time of the file explicitly, so the least
+    recently used entries are removed first when total size of the files
+    exceeds `max_size` bytes. Modification time of the file is the time
+    of the entry creation, entries older than `timeout` seconds are
+    expired.
+    """
+
+    def __init__(self, location=None, max_size=None, timeout=None):
+        if location is None:
+            location = getattr(settings, 'EXTRA_CBV_FILE_CACHE_ROOT', None) \
+                or os.path.join(tempfile.gettempdir(), 'extra_cbv_cache')
+        if max_size is None:
+            max_size = getattr(settings, 'EXTRA_CBV_FILE_CACHE_MAX_SIZE',
+                               1024 * 1024 * 1024)
+        self.location = location
+        self.max_size = max_size
+        self.timeout = timeout
+
+    def get_path(self, key):
+        return os.path.join(self.location, '%s.cache' %
+                            hashlib.sha1(force_bytes(key)).hexdigest())
+
+    def ensure_location(self):
+        try:
+            os.makedirs(self.location)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def get(self, key):
+        """
+        Return (file, modification timestamp) of the entry or None
+        """
+        path = self.get_path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        modified = os.fstat(f.fileno()).st_mtime
+        now = time.time()
+        if self.timeout is not None and modified + self.timeout < now:
+            f.close()
+            self.delete(key)
+            return None
+        try:
+            os.utime(path, (now, modified))
+        except OSError:
+            pass
+        return f, modified
+
+    def set(self, key, write):
+        """
+        Create the entry by `write(output)` function and return it as `get`
+        """
+        self.ensure_location()
+        path = self.get_path(key)
+        tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as output:
+                write(output)
+            os.rename(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.cull(keep=path)
+        return self.get(key)
+
+    def delete(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except OSError:
+            pass
+
+    def cull(self, keep=None):
+        """
+        Remove least recently used entries except of the `keep` file
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.location):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.location, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total_size += stat.st_size
+            if path != keep:
+                entries.append((stat.st_atime, stat.st_size, path))
+        entries.sort()
+        for accessed, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+
+# alias of Django cache which stores versions of the models data
+VERSION_CACHE_ALIAS = 'default'
+
+# concrete models which versions are changed by signals in this process
+_tracked_models = set()
+
+
+def get_model_version_key(model):
+    meta = model._meta.concrete_model._meta
+    return 'extra_cbv.version.%s.%s' % (meta.app_label, meta.model_name)
+
+
+def get_initial_version():
+    # evicted version is restarted from the current time, so it does not
+    # repeat old versions
+    return int(time.time() * 1000)
+
+
+def get_model_versions(models):
+    """
+    Return list of current versions of the models data, the models are
+    tracked from now on
+    """
+    track_models(models)
+    cache = caches[VERSION_CACHE_ALIAS]
+    keys = [get_model_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, get_initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(model):
+    """
+    Change version of the model data, so all cache entries depending on
+    the version are not used anymore
+    """
+    cache = caches[VERSION_CACHE_ALIAS]
+    key = get_model_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, get_initial_version(), None)
+
+
+def mark_model_changed(model, using=None):
+    """
+    Change version of the model data now and after the commit of the
+    current transaction. Concurrent requests can cache the old data under
+    the first version until the commit, the second version drops them.
+    """
+    # data of the parents of multi-table inheritance is changed too
+    models = [model] + list(model._meta.get_parent_list())
+
+    def bump():
+        for changed_model in models:
+            bump_model_version(changed_model)
+
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def model_changed(sender, using=None, **kwargs):
+    mark_model_changed(sender, using)
+
+
+def m2m_relation_changed(sender, instance, action, model, using=None,
+                         **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        mark_model_changed(sender, using)
+        mark_model_changed(instance.__class__, using)
+        mark_model_changed(model, using)
+
+
+def get_signal_senders(model):
+    """
+    Return models which signals mean changes of the `model` data: the
+    model, its proxies and subclasses
+    """
+    concrete_model = model._meta.concrete_model
+    return [other for other in apps.get_models()
+            if other._meta.concrete_model is concrete_model or
+            concrete_model in other._meta.get_parent_list()]
+
+
+def track_models(models):
+    """
+    Change versions of the models data by save, delete and m2m changes
+    signals. Receivers are connected for the tracked models only, so
+    deletes of other models are not slowed down by signals.
+
+    Versions are changed in the processes which track the models. Views
+    track models of their caches when they are created by `as_view()`,
+    call it (in `AppConfig.ready` for example) in other processes which
+    change the data. `QuerySet.update()` and raw SQL don't send signals,
+    call `mark_model_changed` after them.
+    """
+    for model in models:
+        concrete_model = model._meta.concrete_model
+        if concrete_model in _tracked_models:
+            continue
+        _tracked_models.add(concrete_model)
+        label = concrete_model._meta.label_lower
+        for sender in get_signal_senders(concrete_model):
+            uid = 'extra_cbv.cache.%s.%s' % (label,
+                                             sender._meta.label_lower)
+            post_save.connect(model_changed, sender=sender,
+                              dispatch_uid=uid + '.post_save')
+            post_delete.connect(model_changed, sender=sender,
+                                dispatch_uid=uid + '.post_delete')
+        for field in concrete_model._meta.get_fields(include_hidden=True):
+            if field.many_to_many:
+                through = field.remote_field.through if field.concrete \
+                    else field.through
+                m2m_changed.connect(
+                    m2m_relation_changed, sender=through,
+                    dispatch_uid='extra_cbv.cache.%s.m2m_changed' %
+                    through._meta.label_lower)
@@ -0,0 +1,115 @@
+# coding: utf-8
+"""
+On the fly compression of responses
+"""
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+from .utils import parse_quality_values
+
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """
+    Compress iterator of bytes into gzip stream. Every chunk is flushed,
+    so the client gets data as soon as it is generated.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + \
+            compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def zstd_stream(chunks, level=ZSTD_LEVEL):
+    """
+    Compress iterator of bytes into zstd stream, it requires `zstandard`
+    package.
+    """
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + \
+            compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def has_zstd_support():
+    try:
+        import zstandard  # NOQA
+    except ImportError:
+        return False
+    return True
+
+
+def get_encoders():
+    """
+    Return list of (content encoding, stream function) in order of
+    preference
+    """
+    encoders = []
+    if has_zstd_support():
+        encoders.append(('zstd', zstd_stream))
+    encoders.append(('gzip', gzip_stream))
+    return encoders
+
+
+def parse_accept_encoding(header):
+    """
+    Return mapping of content encodings to their quality values
+    """
+    return parse_quality_values(header)
+
+
+def negotiate_encoding(request, encoders=None):
+    """
+    Return (content encoding, stream function) accepted by the client or
+    None
+    """
+    if encoders is None:
+        encoders = get_encoders()
+    accepted = parse_accept_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for name, stream in encoders:
+        if accepted.get(name, accepted.get('*', 0)) > 0:
+            return name, stream
+    return None
+
+
+def compress_response(request, response, encoders=None):
+    """
+    Compress content of the response by the encoding negotiated from
+    `Accept-Encoding` header of the request. Streaming responses are
+    compressed chunk by chunk without buffering.
+    """
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    encoding = negotiate_encoding(request, encoders)
+    if encoding is None:
+        return response
+    name, stream = encoding
+
+    if response.streaming:
+        response.streaming_content = stream(response.streaming_content)
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+    else:
+        response.content = b''.join(stream([response.content]))
+        response['Content-Length'] = str(len(response.content))
+    if response.has_header('Accept-Ranges'):
+        del response['Accept-Ranges']
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = name
+    return response
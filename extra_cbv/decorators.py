@@ -1,6 +1,8 @@
 # coding: utf-8
 
-from django.http.response import JsonResponse, HttpResponse
+from django.http.response import HttpResponse
+
+from .encoders import EncodedJsonResponse
 
 
 def json_response(func):
@@ -8,5 +10,5 @@ def json_response(func):
         response = func(request, *args, **kwargs)
         if isinstance(response, HttpResponse):
             return response
-        return JsonResponse(response)
+        return EncodedJsonResponse(response)
     return wrapped
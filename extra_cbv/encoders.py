@@ -0,0 +1,203 @@
+# coding: utf-8
+"""
+Registry of JSON encoders and encoders of other media types.
+
+Encoder is a function which converts data into JSON bytes. Encoders keep
+Django types handling: dates, times, decimals, UUIDs and lazy strings are
+encoded by `JSONEncoder.default`. The default encoder is set by
+`EXTRA_CBV_JSON_ENCODER` setting, the first installed encoder of
+`PREFERRED_ENCODERS` is used when it is not set.
+
+Compact binary formats (MessagePack) are registered by their media types
+and are chosen by `Accept` header of the request.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import Promise
+
+from .utils import get_media_type_quality, parse_quality_values
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder which knows how to encode lazy strings
+    """
+
+    def default(self, o):
+        if isinstance(o, Promise):
+            return force_text(o)
+        return super(JSONEncoder, self).default(o)
+
+
+default = JSONEncoder().default
+
+
+def json_dumps(data):
+    return force_bytes(json.dumps(data, cls=JSONEncoder))
+
+
+def simplejson_dumps(data):
+    import simplejson
+    # decimals are encoded as strings like DjangoJSONEncoder does
+    return force_bytes(simplejson.dumps(data, default=default,
+                                        use_decimal=False))
+
+
+def orjson_dumps(data):
+    # orjson is available on Python 3 only
+    import orjson
+    # dates and times are encoded by `default` to keep Django format
+    return orjson.dumps(data, default=default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME |
+                        orjson.OPT_NON_STR_KEYS)
+
+
+ENCODERS = {}
+
+# encoders checked in order when the default encoder is not set. On Python
+# 2.7 the C encoder of stdlib json is faster than simplejson speedups
+# (benchmarks/encoders.py).
+PREFERRED_ENCODERS = ['json']
+
+# modules required by encoders
+ENCODER_MODULES = {
+    'simplejson': 'simplejson',
+    'orjson': 'orjson',
+}
+
+
+def register_encoder(name, dumps, module=None):
+    ENCODERS[name] = dumps
+    if module is not None:
+        ENCODER_MODULES[name] = module
+
+
+register_encoder('json', json_dumps)
+register_encoder('simplejson', simplejson_dumps)
+register_encoder('orjson', orjson_dumps)
+
+
+def is_available(name):
+    module = ENCODER_MODULES.get(name)
+    if module is None:
+        return True
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+_default_name = None
+
+
+def get_default_encoder_name():
+    global _default_name
+    name = getattr(settings, 'EXTRA_CBV_JSON_ENCODER', None)
+    if name is not None:
+        return name
+    if _default_name is None:
+        for name in PREFERRED_ENCODERS:
+            if is_available(name):
+                _default_name = name
+                break
+    return _default_name
+
+
+def get_encoder(name=None):
+    """
+    Return encoder function by its name or the default encoder
+    """
+    if name is None:
+        name = get_default_encoder_name()
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ImproperlyConfigured(u'Unknown JSON encoder %r' % name)
+
+
+def dumps(data, encoder=None):
+    return get_encoder(encoder)(data)
+
+
+class EncodedJsonResponse(HttpResponse):
+    """
+    Like `django.http.JsonResponse`, but data is encoded by the encoder
+    from the registry
+    """
+
+    def __init__(self, data, encoder=None, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be '
+                            'serialized set the safe parameter to False')
+        kwargs.setdefault('content_type', 'application/json')
+        super(EncodedJsonResponse, self).__init__(
+            content=dumps(data, encoder), **kwargs)
+
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def msgpack_dumps(data):
+    import msgpack
+    # Python 2 `str` keys and values are text, they are packed as msgpack
+    # strings rather than binary data
+    return msgpack.packb(data, default=default, use_bin_type=False)
+
+
+# media type -> (encoder, required module)
+MEDIA_TYPES = {}
+
+
+def register_media_type(media_type, dumps, module=None):
+    MEDIA_TYPES[media_type] = (dumps, module)
+
+
+register_media_type('application/msgpack', msgpack_dumps, 'msgpack')
+register_media_type('application/x-msgpack', msgpack_dumps, 'msgpack')
+
+
+def is_media_type_available(media_type):
+    if media_type == JSON_MEDIA_TYPE:
+        return True
+    if media_type not in MEDIA_TYPES:
+        return False
+    module = MEDIA_TYPES[media_type][1]
+    if module is None:
+        return True
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def get_media_type_encoder(media_type, json_encoder=None):
+    """
+    Return encoder of the media type, JSON is encoded by `json_encoder`
+    """
+    if media_type == JSON_MEDIA_TYPE:
+        return get_encoder(json_encoder)
+    return MEDIA_TYPES[media_type][0]
+
+
+def negotiate_media_type(request, media_types):
+    """
+    Return one of available `media_types` accepted by `Accept` header of
+    the request with the highest quality, the first one by default.
+    Ranges like `*/*` and `application/*` match the media types.
+    """
+    media_types = [media_type for media_type in media_types
+                   if is_media_type_available(media_type)]
+    accepted = parse_quality_values(request.META.get('HTTP_ACCEPT', ''))
+    best, best_quality = media_types[0], 0
+    for media_type in media_types:
+        quality = get_media_type_quality(accepted, media_type)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
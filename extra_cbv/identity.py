@@ -0,0 +1,49 @@
+# coding: utf-8
+"""
+Identity map of the objects loaded by views during the request
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+from .cache import get_model_versions
+
+
+# alias of Django cache which stores objects across requests
+OBJECT_CACHE_ALIAS = 'default'
+
+
+def get_identity_map(request):
+    """
+    Return mapping of the keys to the objects loaded during the request
+    """
+    try:
+        return request._extra_cbv_identity_map
+    except AttributeError:
+        identity_map = request._extra_cbv_identity_map = {}
+        return identity_map
+
+
+def load_object(request, key, load, model, cache_timeout=None):
+    """
+    Return the object with `key` loaded by `load()` function once per
+    request. With `cache_timeout` the object is cached across requests
+    for `cache_timeout` seconds or until data of the model is changed.
+    Exceptions of `load` are not cached.
+    """
+    identity_map = get_identity_map(request)
+    if key in identity_map:
+        return identity_map[key]
+    if cache_timeout:
+        cache = caches[OBJECT_CACHE_ALIAS]
+        cache_key = 'extra_cbv.object.%s' % hashlib.sha1(force_bytes(repr(
+            (key, get_model_versions([model]))))).hexdigest()
+        obj = cache.get(cache_key)
+        if obj is None:
+            obj = load()
+            cache.set(cache_key, obj, cache_timeout)
+    else:
+        obj = load()
+    identity_map[key] = obj
+    return obj
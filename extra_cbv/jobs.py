@@ -0,0 +1,393 @@
+# coding: utf-8
+"""
+Background jobs which build files outside of the request/response cycle
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import tempfile
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import connections
+from django.utils.encoding import force_bytes, force_text
+
+
+logger = logging.getLogger(__name__)
+
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# POST parameters which differ in identical requests
+VOLATILE_POST_PARAMETERS = ('csrfmiddlewaretoken',)
+
+
+def get_job_owner(request, create_session=True):
+    """
+    Return owner of the jobs started by the request: pk of the user or
+    the session key of anonymous users. Session of anonymous user is
+    created when `create_session` is True.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.pk is not None:
+        return u'user:%s' % user.pk
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    if session.session_key is None:
+        if not create_session:
+            return None
+        session.modified = True
+        session.save()
+    return u'session:%s' % session.session_key
+
+
+def get_request_parameters(request):
+    """
+    Return sorted GET and POST parameters of the request which identify
+    the job
+    """
+    return (
+        sorted(request.GET.lists()),
+        sorted([(name, values) for name, values in request.POST.lists()
+                if name not in VOLATILE_POST_PARAMETERS]),
+    )
+
+
+def get_process_info():
+    return {
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+    }
+
+
+def is_process_alive(meta):
+    """
+    Return False if the job was run by the process of this host which
+    does not exist anymore. Processes of other hosts can not be checked,
+    they are considered alive.
+    """
+    pid = meta.get('pid')
+    if pid is None or meta.get('host') != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class BaseJobStore(object):
+    """
+    Store status and result files of the jobs.
+
+    Every job has a `key`, only one job with the same key can be active at
+    the same time, so identical requests share the same job.
+    """
+
+    def create(self, key, **meta):
+        """
+        Create new job with `meta` data or return active job with the same
+        key. Return (job_id, created) tuple.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """
+        Return meta data of the job or None if it does not exist
+        """
+        raise NotImplementedError
+
+    def update(self, job_id, **meta):
+        raise NotImplementedError
+
+    def release(self, key, job_id):
+        """
+        Mark the job with `key` as finished, so the next job with the same
+        key can be created
+        """
+        raise NotImplementedError
+
+    def open_result(self, job_id, mode='rb'):
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+
+class FileSystemJobStore(BaseJobStore):
+    """
+    Keep jobs in the directory: meta data in `<job_id>.json` files and
+    results in `<job_id>.data` files. Active jobs are locked by
+    `<key hash>.lock` files with id of the job, locks older than
+    `lock_timeout` seconds are considered stale (the worker was killed)
+    and are taken over. Active jobs of the process which is gone (the
+    worker was recycled) are failed at once.
+
+    Finished jobs and their results are removed `result_timeout` seconds
+    after the last change, the directory is cleaned up by new jobs at most
+    every `cleanup_interval` seconds.
+    """
+    cleanup_interval = 10 * 60
+
+    def __init__(self, location=None, lock_timeout=6 * 60 * 60,
+                 result_timeout=24 * 60 * 60):
+        if location is None:
+            location = getattr(settings, 'EXTRA_CBV_JOBS_ROOT', None) or \
+                os.path.join(tempfile.gettempdir(), 'extra_cbv_jobs')
+        self.location = location
+        self.lock_timeout = lock_timeout
+        self.result_timeout = result_timeout
+        self.cleaned_up = None
+
+    def get_path(self, name):
+        return os.path.join(self.location, name)
+
+    def get_lock_path(self, key):
+        return self.get_path('%s.lock' % hashlib.sha1(force_bytes(key))
+                             .hexdigest())
+
+    def ensure_location(self):
+        try:
+            os.makedirs(self.location)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def create(self, key, **meta):
+        self.ensure_location()
+        now = time.time()
+        if self.cleaned_up is None or \
+                self.cleaned_up + self.cleanup_interval < now:
+            self.cleaned_up = now
+            self.cleanup()
+        lock_path = self.get_lock_path(key)
+        job_id = uuid.uuid4().hex
+        meta.update(get_process_info())
+        meta.update({
+            'status': STATUS_PENDING,
+            'created': now,
+        })
+        self.write_meta(job_id, meta)
+
+        # the lock is created with id of the job at once by hard link
+        tmp_path = self.get_path('%s.lock.tmp' % job_id)
+        with open(tmp_path, 'w') as f:
+            f.write(job_id)
+        try:
+            while True:
+                try:
+                    os.link(tmp_path, lock_path)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                    active_id = self.get_active_job_id(lock_path)
+                    if active_id is not None:
+                        self.delete(job_id)
+                        return active_id, False
+                else:
+                    return job_id, True
+        finally:
+            os.remove(tmp_path)
+
+    def get_active_job_id(self, lock_path):
+        """
+        Return id of the job which holds the lock or remove the stale lock
+        """
+        try:
+            with open(lock_path) as f:
+                job_id = f.read().strip()
+            stale = os.path.getmtime(lock_path) + self.lock_timeout < \
+                time.time()
+        except (IOError, OSError):
+            # lock was released right now
+            return None
+        meta = self.get(job_id)
+        if not stale and meta is not None and \
+                meta['status'] in ACTIVE_STATUSES:
+            return job_id
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+        return None
+
+    def get(self, job_id):
+        if not JOB_ID_RE.match(job_id or ''):
+            return None
+        try:
+            with open(self.get_path('%s.json' % job_id)) as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if meta['status'] in ACTIVE_STATUSES and not is_process_alive(meta):
+            meta.update({
+                'status': STATUS_FAILED,
+                'error': u'Worker process of the job is gone',
+                'finished': time.time(),
+            })
+            self.write_meta(job_id, meta)
+        return meta
+
+    def write_meta(self, job_id, meta):
+        path = self.get_path('%s.json' % job_id)
+        tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, path)
+
+    def update(self, job_id, **meta):
+        data = self.get(job_id) or {}
+        data.update(meta)
+        self.write_meta(job_id, data)
+
+    def release(self, key, job_id):
+        lock_path = self.get_lock_path(key)
+        try:
+            with open(lock_path) as f:
+                locked_id = f.read().strip()
+            if locked_id == job_id:
+                os.remove(lock_path)
+        except (IOError, OSError):
+            pass
+
+    def open_result(self, job_id, mode='rb'):
+        return open(self.get_path('%s.data' % job_id), mode)
+
+    def delete(self, job_id):
+        for name in ('%s.json', '%s.data'):
+            try:
+                os.remove(self.get_path(name % job_id))
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """
+        Remove finished jobs, stale locks and temporary files older than
+        `result_timeout` seconds
+        """
+        expired = time.time() - self.result_timeout
+        for name in os.listdir(self.location):
+            path = self.get_path(name)
+            try:
+                if os.path.getmtime(path) > expired:
+                    continue
+            except OSError:
+                continue
+            if name.endswith('.lock'):
+                # removes the lock if it is stale
+                self.get_active_job_id(path)
+            elif name.endswith('.tmp') or name.endswith('.data') and \
+                    not os.path.exists(path[:-len('.data')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif name.endswith('.json'):
+                job_id = name[:-len('.json')]
+                meta = self.get(job_id)
+                if meta is None or meta['status'] not in ACTIVE_STATUSES:
+                    self.delete(job_id)
+
+
+class BaseJobBackend(object):
+
+    def submit(self, func, *args):
+        raise NotImplementedError
+
+
+def close_connections():
+    for conn in connections.all():
+        conn.close()
+
+
+def run_in_thread(func, *args):
+    """
+    Run the job in the thread of the pool and close database connections
+    of the thread after it
+    """
+    try:
+        func(*args)
+    finally:
+        close_connections()
+
+
+class ThreadPoolJobBackend(BaseJobBackend):
+    """
+    Run jobs in the pool of threads of the current process. Every thread
+    uses its own database connections, they are closed after every job.
+    """
+
+    def __init__(self, processes=None):
+        if processes is None:
+            processes = getattr(settings, 'EXTRA_CBV_JOBS_WORKERS', 2)
+        self.processes = processes
+        self.pool = None
+
+    def submit(self, func, *args):
+        if self.pool is None:
+            self.pool = ThreadPool(self.processes)
+        self.pool.apply_async(run_in_thread, (func,) + args)
+
+
+def run_job(store, key, job_id, build):
+    """
+    Build result of the job by `build(output)` function
+    """
+    store.update(job_id, status=STATUS_RUNNING, started=time.time(),
+                 **get_process_info())
+    try:
+        with store.open_result(job_id, 'wb') as output:
+            build(output)
+    except Exception as e:
+        logger.exception('Job %s failed', job_id)
+        store.update(job_id, status=STATUS_FAILED, error=force_text(e),
+                     finished=time.time())
+    else:
+        store.update(job_id, status=STATUS_DONE, finished=time.time())
+    finally:
+        store.release(key, job_id)
+
+
+def start_job(store, backend, key, build, **meta):
+    """
+    Start new job or return active job with the same `key`.
+    Return (job_id, meta) tuple.
+    """
+    job_id, created = store.create(key, **meta)
+    if created:
+        backend.submit(run_job, store, key, job_id, build)
+    return job_id, store.get(job_id)
+
+
+_default_store = None
+_default_backend = None
+
+
+def get_default_job_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = FileSystemJobStore()
+    return _default_store
+
+
+def get_default_job_backend():
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = ThreadPoolJobBackend()
+    return _default_backend
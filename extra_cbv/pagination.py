@@ -0,0 +1,320 @@
+# coding: utf-8
+"""
+Paginators of large querysets
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, \
+    PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import cached_property
+
+from .cache import EmptyResultSet, get_queryset_key
+from .utils import get_lookup_field
+
+
+# seconds to cache counts of querysets
+COUNT_CACHE_TIMEOUT = 60
+
+# counts estimated by the database above the threshold are not counted
+# exactly
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+
+def estimate_count(queryset):
+    """
+    Return rows count of the queryset estimated by the query planner of
+    PostgreSQL or MySQL, or None for other databases
+    """
+    connection = connections[queryset.db]
+    if connection.vendor not in ('postgresql', 'mysql'):
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, six.string_types):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [column[0] for column in cursor.description]
+        row = cursor.fetchone()
+        return int(row[columns.index('rows')] or 0)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator which caches count of the queryset for `count_cache_timeout`
+    seconds by the key of the queryset SQL, so pages of the same list do
+    not run `COUNT(*)` every time
+    """
+    count_cache_alias = 'default'
+    count_cache_timeout = COUNT_CACHE_TIMEOUT
+
+    def get_count(self):
+        return self.object_list.count()
+
+    def get_count_cache_key(self):
+        return 'extra_cbv.count.%s' % hashlib.sha1(force_bytes(
+            get_queryset_key(self.object_list))).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        cache = caches[self.count_cache_alias]
+        key = self.get_count_cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = self.get_count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """
+    Paginator which uses count estimated by the database when it is above
+    `estimate_threshold`, small querysets are counted exactly. Pages at the
+    end of the list can be empty or missed if the estimate is inaccurate.
+    """
+    estimate_threshold = COUNT_ESTIMATE_THRESHOLD
+    count_is_estimated = False
+
+    def get_count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            self.count_is_estimated = True
+            return estimate
+        return super(EstimatedCountPaginator, self).get_count()
+
+
+class CountlessPage(Page):
+    """
+    Page of `CountlessPaginator` which knows if there is the next page
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super(CountlessPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return (self.number - 1) * self.paginator.per_page + \
+            len(self.object_list)
+
+
+class CountlessPaginator(Paginator):
+    """
+    Paginator without count of objects. The page fetches one object more
+    than `per_page` to know if there is the next page, `count` and
+    `num_pages` are None.
+    """
+    count = None
+    num_pages = None
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page +
+                                            1])
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        return CountlessPage(object_list[:self.per_page], number, self,
+                             len(object_list) > self.per_page)
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(backward, values):
+    """
+    Return opaque token of the position in the ordered queryset
+    """
+    values = [value if value is None or isinstance(
+        value, six.integer_types + (bool, float)) else force_text(value)
+        for value in values]
+    data = json.dumps([1 if backward else 0, values], separators=(',', ':'))
+    return force_text(base64.urlsafe_b64encode(force_bytes(data)))
+
+
+def decode_cursor(cursor):
+    """
+    Return (backward, values) of the cursor token
+    """
+    try:
+        data = json.loads(force_text(
+            base64.urlsafe_b64decode(force_bytes(cursor))))
+        backward, values = data
+    except (TypeError, ValueError, binascii.Error):
+        raise InvalidCursor(u'Invalid cursor')
+    if not isinstance(values, list):
+        raise InvalidCursor(u'Invalid cursor')
+    return bool(backward), values
+
+
+def get_seek_filter(ordering, values):
+    """
+    Return filter of rows following the row with `values` of the ordering
+    columns in the order of (column name, descending) pairs `ordering`:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    seek = None
+    equal = {}
+    for (name, descending), value in zip(ordering, values):
+        condition = dict(equal)
+        condition['%s__%s' % (name, 'lt' if descending else 'gt')] = value
+        seek = Q(**condition) if seek is None else seek | Q(**condition)
+        equal[name] = value
+    return seek
+
+
+class CursorPage(object):
+    """
+    Page of `CursorPaginator`, it has `next_cursor` and `previous_cursor`
+    tokens instead of page numbers
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page of %d objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator(object):
+    """
+    Keyset paginator. Pages are selected by the values of the ordering
+    columns of the first or the last row of the neighbour page, so there is
+    no `COUNT(*)` and `OFFSET` in queries and the cost of the page does not
+    depend on its position.
+
+    Ordering columns must be not null fields of the model itself, pk is
+    added to the ordering to make it unique. The database index by the
+    ordering columns makes the pages cheap.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('pk',)):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = []
+        self.attnames = []
+        model = queryset.model
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = get_lookup_field(model, name)
+            if field is None or LOOKUP_SEP in name:
+                raise ImproperlyConfigured(
+                    u"Cursor pagination can not be ordered by '%s'" % name)
+            if field.null:
+                # NULL values are never matched by the seek filter
+                raise ImproperlyConfigured(
+                    u"Cursor pagination can not be ordered by nullable "
+                    u"field '%s'" % name)
+            self.ordering.append((name, descending))
+            self.attnames.append(field.attname)
+        if not any(name == 'pk' or name == model._meta.pk.name or
+                   attname == model._meta.pk.attname
+                   for (name, descending), attname
+                   in zip(self.ordering, self.attnames)):
+            descending = self.ordering[-1][1] if self.ordering else False
+            self.ordering.append(('pk', descending))
+            self.attnames.append(model._meta.pk.attname)
+
+    def get_order_by(self, ordering):
+        return ['%s%s' % ('-' if descending else '', name)
+                for name, descending in ordering]
+
+    def get_key(self, obj):
+        return [getattr(obj, attname) for attname in self.attnames]
+
+    def page(self, cursor=None):
+        """
+        Return the page after (or before for backward cursor) the cursor
+        position, or the first page
+        """
+        ordering = self.ordering
+        backward = False
+        queryset = self.queryset
+        if cursor:
+            backward, values = decode_cursor(cursor)
+            if len(values) != len(ordering):
+                raise InvalidCursor(u'Invalid cursor')
+            if backward:
+                ordering = [(name, not descending)
+                            for name, descending in ordering]
+            try:
+                queryset = queryset.filter(get_seek_filter(ordering, values))
+            except (TypeError, ValueError, ValidationError):
+                raise InvalidCursor(u'Invalid cursor')
+
+        queryset = queryset.order_by(*self.get_order_by(ordering))
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        next_cursor = previous_cursor = None
+        if backward:
+            object_list.reverse()
+            if object_list:
+                next_cursor = encode_cursor(False,
+                                            self.get_key(object_list[-1]))
+                if has_more:
+                    previous_cursor = encode_cursor(
+                        True, self.get_key(object_list[0]))
+        elif object_list:
+            if has_more:
+                next_cursor = encode_cursor(False,
+                                            self.get_key(object_list[-1]))
+            if cursor:
+                previous_cursor = encode_cursor(
+                    True, self.get_key(object_list[0]))
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
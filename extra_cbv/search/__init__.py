@@ -0,0 +1,8 @@
+# coding: utf-8
+"""
+Search backends of `SearchMixin`.
+
+Backends which keep their own index (`InvertedIndexSearchBackend`,
+`SQLiteSearchBackend`) require `extra_cbv.search` in INSTALLED_APPS.
+"""
+default_app_config = 'extra_cbv.search.apps.SearchConfig'
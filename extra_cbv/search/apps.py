@@ -0,0 +1,8 @@
+# coding: utf-8
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    name = 'extra_cbv.search'
+    label = 'extra_cbv_search'
+    verbose_name = 'Search index'
@@ -0,0 +1,383 @@
+# coding: utf-8
+"""
+Search backends. Backend filters the queryset by the query string, ranked
+backends annotate objects by `search_rank` and order them by the rank.
+"""
+import operator
+import re
+from collections import Counter
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Count, F
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query_utils import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.module_loading import import_string
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# max length of the indexed term
+TERM_MAX_LENGTH = 64
+
+
+def tokenize(text):
+    """
+    Return list of lower case words of the text
+    """
+    return [token[:TERM_MAX_LENGTH]
+            for token in TOKEN_RE.findall(force_text(text).lower())]
+
+
+def get_search_text(obj, fields):
+    """
+    Return text of the object `fields` which can be related lookups
+    """
+    values = []
+    for lookup in fields:
+        value = obj
+        for name in lookup.split(LOOKUP_SEP):
+            value = getattr(value, name, None)
+            if value is None:
+                break
+        if value is not None:
+            values.append(force_text(value))
+    return u'\n'.join(values)
+
+
+class BaseSearchBackend(object):
+
+    def search(self, queryset, query, fields):
+        """
+        Return the queryset filtered by `query` string in the `fields`
+        """
+        raise NotImplementedError('You must override `search` method in '
+                                  'child backend')
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """
+    Objects containing the query string in any of the fields. It is
+    not ranked and can not use indexes.
+    """
+
+    def search(self, queryset, query, fields):
+        lookup = None
+        for field in fields:
+            if lookup is None:
+                lookup = Q(**{'%s__icontains' % field: query})
+            else:
+                lookup = lookup | Q(**{'%s__icontains' % field: query})
+        if lookup is None:
+            return queryset
+        return queryset.filter(lookup)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL full text search ranked by `ts_rank`. The index is used
+    when the model has `vector_field` (`SearchVectorField` with GIN index)
+    or there is GIN index by the same `SearchVector` expression.
+
+    With `trigram = True` objects similar to the query by trigrams are
+    found, it requires `pg_trgm` extension and `django.contrib.postgres` in
+    INSTALLED_APPS.
+    """
+    config = None
+    vector_field = None
+    trigram = False
+
+    def __init__(self, config=None, vector_field=None, trigram=None):
+        if config is not None:
+            self.config = config
+        if vector_field is not None:
+            self.vector_field = vector_field
+        if trigram is not None:
+            self.trigram = trigram
+
+    def search(self, queryset, query, fields):
+        if self.trigram:
+            return self.search_trigram(queryset, query, fields)
+        from django.contrib.postgres.search import SearchQuery, SearchRank, \
+            SearchVector
+
+        search_query = SearchQuery(query, config=self.config)
+        if self.vector_field is not None:
+            vector = F(self.vector_field)
+            lookup = self.vector_field
+        else:
+            queryset = queryset.annotate(
+                search_vector=SearchVector(*fields, config=self.config))
+            vector = F('search_vector')
+            lookup = 'search_vector'
+        return queryset.filter(**{lookup: search_query}) \
+            .annotate(search_rank=SearchRank(vector, search_query)) \
+            .order_by('-search_rank')
+
+    def search_trigram(self, queryset, query, fields):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        lookup = reduce(operator.or_, [
+            Q(**{'%s__trigram_similar' % field: query}) for field in fields])
+        rank = reduce(operator.add, [
+            TrigramSimilarity(field, query) for field in fields])
+        return queryset.filter(lookup).annotate(search_rank=rank) \
+            .order_by('-search_rank')
+
+
+def get_related_paths(model, lookup):
+    """
+    Return list of (related model, path) pairs of the relations followed
+    by the `lookup`, objects of `model` referencing the related object are
+    selected by `path`. Only foreign keys and one-to-one fields can be
+    followed.
+    """
+    paths = []
+    names = lookup.split(LOOKUP_SEP)
+    for i, name in enumerate(names[:-1]):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or \
+                not (field.many_to_one or field.one_to_one):
+            raise ImproperlyConfigured(
+                u"Search field '%s' can follow foreign keys only" % lookup)
+        model = field.related_model
+        paths.append((model, LOOKUP_SEP.join(names[:i + 1])))
+    return paths
+
+
+class IndexSearchBackend(BaseSearchBackend):
+    """
+    Base of backends which keep their own index of the objects. Models
+    are added to the index by `register(model, fields)` of the instance
+    returned by `get_search_backend()` at startup (in `AppConfig.ready`
+    for example), then the index is updated by save and delete signals of
+    the model. Existing objects are indexed by `reindex(model)`. Search
+    `fields` of the view are ignored, the registered fields are searched.
+
+    Fields can be lookups following foreign keys like `author__name`,
+    objects are reindexed when the related objects are saved.
+    """
+
+    def __init__(self):
+        self.registry = {}
+        # related model -> set of (registered model, path to the related)
+        self.dependents = {}
+
+    def register(self, model, fields):
+        fields = list(fields)
+        paths = []
+        for lookup in fields:
+            paths.extend(get_related_paths(model, lookup))
+        self.registry[model] = fields
+        uid = 'extra_cbv.search.%s.%s.%s' % (
+            self.__class__.__name__, id(self), model._meta.label_lower)
+        post_save.connect(self.object_saved, sender=model,
+                          dispatch_uid=uid + '.post_save')
+        post_delete.connect(self.object_deleted, sender=model,
+                            dispatch_uid=uid + '.post_delete')
+        for related_model, path in paths:
+            self.dependents.setdefault(related_model, set()).add(
+                (model, path))
+            post_save.connect(self.related_object_saved, sender=related_model,
+                              dispatch_uid='%s.related.%s' % (
+                                  uid, related_model._meta.label_lower))
+
+    def get_fields(self, model):
+        try:
+            return self.registry[model]
+        except KeyError:
+            raise ImproperlyConfigured(
+                u'%s is not registered in the search index' %
+                model.__name__)
+
+    def get_content_type(self, model):
+        from django.contrib.contenttypes.models import ContentType
+        return ContentType.objects.get_for_model(model)
+
+    def object_saved(self, sender, instance, raw=False, **kwargs):
+        if not raw:
+            self.index_object(instance)
+
+    def object_deleted(self, sender, instance, **kwargs):
+        self.remove_object(instance)
+
+    def related_object_saved(self, sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        for model, path in self.dependents.get(sender, ()):
+            objects = model._default_manager.using(instance._state.db) \
+                .filter(**{path: instance.pk})
+            for obj in objects.iterator():
+                self.index_object(obj)
+
+    def reindex(self, model):
+        """
+        Index all objects of the model
+        """
+        for obj in model._default_manager.all().iterator():
+            self.index_object(obj)
+
+    def index_object(self, obj):
+        raise NotImplementedError
+
+    def remove_object(self, obj):
+        raise NotImplementedError
+
+
+class InvertedIndexSearchBackend(IndexSearchBackend):
+    """
+    Search by the inverted index table of `IndexEntry` terms. Objects
+    containing all words of the query are found, they are ranked by the
+    number of occurrences of the words. Models must have integer pks.
+    """
+
+    def index_object(self, obj):
+        from .models import IndexEntry
+
+        content_type = self.get_content_type(obj.__class__)
+        terms = Counter(tokenize(get_search_text(
+            obj, self.get_fields(obj.__class__))))
+        with transaction.atomic(using=obj._state.db):
+            self.remove_object(obj)
+            IndexEntry.objects.using(obj._state.db).bulk_create([
+                IndexEntry(content_type=content_type, object_id=obj.pk,
+                           term=term, weight=count)
+                for term, count in terms.items()])
+
+    def remove_object(self, obj):
+        from .models import IndexEntry
+
+        entries = IndexEntry.objects.using(obj._state.db).filter(
+            content_type=self.get_content_type(obj.__class__),
+            object_id=obj.pk)
+        # entries have no relations, so they are deleted by one query
+        # without signals
+        entries._raw_delete(entries.db)
+
+    def search(self, queryset, query, fields):
+        from .models import IndexEntry
+
+        self.get_fields(queryset.model)
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return queryset
+        content_type = self.get_content_type(queryset.model)
+        matched = IndexEntry.objects.filter(
+            content_type=content_type, term__in=terms) \
+            .values('object_id') \
+            .annotate(terms_count=Count('term')) \
+            .filter(terms_count=len(terms)) \
+            .values('object_id')
+
+        connection = connections[queryset.db]
+        qn = connection.ops.quote_name
+        meta = queryset.model._meta
+        rank = (
+            'SELECT SUM(%(weight)s) FROM %(table)s '
+            'WHERE %(content_type)s = %%s AND %(object_id)s = %(pk)s '
+            'AND %(term)s IN (%(terms)s)' % {
+                'weight': qn('weight'),
+                'table': qn(IndexEntry._meta.db_table),
+                'content_type': qn('content_type_id'),
+                'object_id': qn('object_id'),
+                'term': qn('term'),
+                'pk': '%s.%s' % (qn(meta.db_table), qn(meta.pk.column)),
+                'terms': ', '.join(['%s'] * len(terms)),
+            })
+        return queryset.filter(pk__in=matched).extra(
+            select={'search_rank': rank},
+            select_params=[content_type.pk] + terms,
+            order_by=['-search_rank'])
+
+
+class SQLiteSearchBackend(IndexSearchBackend):
+    """
+    Search by SQLite FTS5 index, objects are ranked by bm25. Models must
+    have integer pks.
+    """
+
+    def index_object(self, obj):
+        from .models import FTS_TABLE
+
+        content_type = self.get_content_type(obj.__class__)
+        text = get_search_text(obj, self.get_fields(obj.__class__))
+        connection = connections[obj._state.db]
+        with transaction.atomic(using=obj._state.db):
+            self.remove_object(obj)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO %s (content_type, object_id, body) '
+                    'VALUES (%%s, %%s, %%s)' %
+                    connection.ops.quote_name(FTS_TABLE),
+                    [content_type.pk, obj.pk, text])
+
+    def remove_object(self, obj):
+        from .models import FTS_TABLE
+
+        content_type = self.get_content_type(obj.__class__)
+        connection = connections[obj._state.db]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE content_type = %%s AND object_id = %%s'
+                % connection.ops.quote_name(FTS_TABLE),
+                [content_type.pk, obj.pk])
+
+    def get_match_query(self, query):
+        # words are quoted, so the query has not FTS5 syntax errors
+        return u' '.join([u'"%s"' % token for token in tokenize(query)])
+
+    def search(self, queryset, query, fields):
+        from .models import FTS_TABLE
+
+        self.get_fields(queryset.model)
+        match = self.get_match_query(query)
+        if not match:
+            return queryset
+        content_type = self.get_content_type(queryset.model)
+        qn = connections[queryset.db].ops.quote_name
+        meta = queryset.model._meta
+        fts = qn(FTS_TABLE)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                '%s MATCH %%s' % fts,
+                '%s.content_type = %%s' % fts,
+                '%s.object_id = %s.%s' % (fts, qn(meta.db_table),
+                                          qn(meta.pk.column)),
+            ],
+            params=[match, content_type.pk],
+            select={'search_rank': '-%s.rank' % fts},
+            order_by=['-search_rank'])
+
+
+# backend class -> shared instance of the class
+_backends = {}
+
+
+def get_search_backend(backend=None):
+    """
+    Return the search backend instance from the backend instance, class or
+    its dotted path. The default backend is set by
+    `EXTRA_CBV_SEARCH_BACKEND` setting.
+
+    One instance of the class is shared by all calls, so models registered
+    in `get_search_backend(...).register()` are searched by views which
+    set the backend by the same class or path.
+    """
+    if backend is None:
+        backend = getattr(settings, 'EXTRA_CBV_SEARCH_BACKEND',
+                          IContainsSearchBackend)
+    if isinstance(backend, six.string_types):
+        backend = import_string(backend)
+    if isinstance(backend, type):
+        backend = _backends.get(backend) or \
+            _backends.setdefault(backend, backend())
+    return backend
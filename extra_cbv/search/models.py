@@ -0,0 +1,23 @@
+# coding: utf-8
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+# virtual table of SQLite FTS5 index
+FTS_TABLE = 'extra_cbv_search_fts'
+
+
+class IndexEntry(models.Model):
+    """
+    Term of the indexed object and number of its occurrences
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.BigIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.FloatField(default=1)
+
+    class Meta:
+        index_together = [
+            ('content_type', 'term'),
+            ('content_type', 'object_id'),
+        ]
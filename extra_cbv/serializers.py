@@ -1,11 +1,24 @@
 # coding: utf-8
 import inspect
+import itertools
 
+from django.core.exceptions import FieldDoesNotExist
 from django.core.serializers.python import Serializer
-from django.utils.encoding import force_text
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields import Field
+from django.db.models.fields.related import ForeignObjectRel
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_text, is_protected_type
 
 from simplejson import OrderedDict
 
+from .encoders import get_encoder
+from .utils import get_lookup_field
+
+
+# number of objects serialized together by iterators
+SERIALIZE_CHUNK_SIZE = 500
+
 
 class PythonSerializer(Serializer):
     def get_dump_object(self, obj):
@@ -23,26 +36,385 @@ class PythonSerializer(Serializer):
         return data
 
 
+def overrides(field, name):
+    """
+    Check if the field class overrides method `name` of the base `Field`
+    """
+    method = getattr(type(field), name)
+    base_method = getattr(Field, name)
+    return getattr(method, '__func__', method) is not \
+        getattr(base_method, '__func__', base_method)
+
+
+class ValueHolder(object):
+    """
+    Stand-in of the model instance which has the single field value, it
+    is enough for `value_to_string` methods of the fields
+    """
+
+    def __init__(self, attname, value):
+        setattr(self, attname, value)
+
+
+def get_value_converter(field):
+    """
+    Return function which converts the database value of the field like
+    `PythonSerializer` does
+    """
+    if not overrides(field, 'value_to_string'):
+        def convert(value):
+            if is_protected_type(value):
+                return value
+            return force_text(value)
+    else:
+        attname = field.attname
+
+        def convert(value):
+            if is_protected_type(value):
+                return value
+            return field.value_to_string(ValueHolder(attname, value))
+    return convert
+
+
+def convert_pk(value):
+    return force_text(value, strings_only=True)
+
+
+class RelatedPks(object):
+    """
+    Loader of pks of the related objects for the batch of objects by one
+    query of the `model` which links the source (by `source_name` field)
+    and the target (by `target_name` field or its pk) objects
+    """
+
+    def __init__(self, name, model, source_name, target_name=None):
+        self.name = name
+        self.model = model
+        self.source = '%s__pk' % source_name
+        self.target = 'pk' if target_name is None else '%s__pk' % target_name
+
+    def fetch(self, pks, chunk_size=SERIALIZE_CHUNK_SIZE):
+        """
+        Return mapping of the source pks to lists of the related pks
+        """
+        related = {}
+        manager = self.model._default_manager
+        for i in range(0, len(pks), chunk_size):
+            rows = manager.filter(**{'%s__in' % self.source:
+                                     pks[i:i + chunk_size]}) \
+                .values_list(self.source, self.target)
+            for source, target in rows:
+                related.setdefault(source, []).append(convert_pk(target))
+        return related
+
+
+def get_related_pks(model, name):
+    """
+    Return `RelatedPks` of many-to-many field or reverse relation `name`
+    of the model
+    """
+    field = model._meta.get_field(name)
+    if isinstance(field, ForeignObjectRel):
+        if field.many_to_many:
+            field = field.field
+            return RelatedPks(name, field.remote_field.through,
+                              field.m2m_reverse_field_name(),
+                              field.m2m_field_name())
+        return RelatedPks(name, field.related_model, field.field.name)
+    if field.many_to_many:
+        return RelatedPks(name, field.remote_field.through,
+                          field.m2m_field_name(),
+                          field.m2m_reverse_field_name())
+    raise ValueError(u'%s is not a many-to-many field or a reverse relation '
+                     u'of %s' % (name, model.__name__))
+
+
+class SerializationPlan(object):
+    """
+    Compiled serialization of the model with the selected fields. Fields,
+    their accessors and converters are resolved once and are reused for
+    every serialized object. Output is the same as `PythonSerializer`
+    output.
+
+    Querysets are serialized from `values_list()` rows without creating
+    model instances, unless some field reads its value from the instance
+    in the special way.
+
+    Many-to-many fields and reverse relations listed in `relations` are
+    serialized as lists of pks. They are loaded by one query per relation
+    for the batch of objects, or taken from `prefetch_related()` caches of
+    the instances.
+
+    Selected fields can be related lookups like `author__name`, they are
+    serialized with the lookup as the key.
+    """
+
+    def __init__(self, model, fields=None, relations=None):
+        self.model = model
+        meta = model._meta.concrete_model._meta
+        self.pk_attname = meta.pk.attname
+
+        self.fields = []
+        for field in meta.local_fields:
+            if not field.serialize:
+                continue
+            if field.remote_field is None:
+                selected_name = field.attname
+            else:
+                selected_name = field.attname[:-3]
+            if fields is None or selected_name in fields:
+                self.fields.append(field)
+
+        self.related = []
+        for field in meta.many_to_many:
+            if field.serialize and \
+                    field.remote_field.through._meta.auto_created and \
+                    (fields is None or field.attname in fields):
+                self.related.append(get_related_pks(model, field.name))
+        for name in relations or ():
+            self.related.append(get_related_pks(model, name))
+
+        self.lookups = []
+        for name in sorted(fields or ()):
+            if LOOKUP_SEP not in name:
+                continue
+            field = get_lookup_field(model, name)
+            if field is None:
+                raise FieldDoesNotExist(u'%s has no field %r' %
+                                        (model.__name__, name))
+            self.lookups.append((name, field))
+
+        self.names = [field.name for field in self.fields] + \
+            [name for name, field in self.lookups]
+        self.attnames = [field.attname for field in self.fields] + \
+            [name for name, field in self.lookups]
+        self.converters = [get_value_converter(field) for field in
+                           self.fields + [f for n, f in self.lookups]]
+        self.use_values = not any(overrides(field, 'value_from_object')
+                                  for field in self.fields)
+
+    def serialize_values(self, queryset):
+        """
+        Serialize the queryset by one `values_list()` query
+        """
+        data = []
+        for chunk in self.iter_values(queryset):
+            data.extend(chunk)
+        return data
+
+    def iter_values(self, queryset, chunk_size=SERIALIZE_CHUNK_SIZE):
+        """
+        Iterate over chunks of serialized `values_list()` rows of the
+        queryset. Rows are read by `iterator()`, so memory usage does not
+        depend on size of the queryset.
+        """
+        names = self.names
+        converters = self.converters
+        rows = queryset.values_list(self.pk_attname, *self.attnames) \
+            .iterator()
+        while True:
+            data = []
+            for row in itertools.islice(rows, chunk_size):
+                item = OrderedDict()
+                item['pk'] = convert_pk(row[0])
+                item.update(zip(names, [convert(value) for convert, value
+                                        in zip(converters, row[1:])]))
+                data.append((row[0], item))
+            if not data:
+                break
+            self.add_related_values(data)
+            yield [item for pk, item in data]
+
+    def add_related_values(self, data, objects=None):
+        """
+        Add lists of related pks to the serialized objects. `data` is list
+        of (pk, serialized object), `objects` are the instances with
+        possibly prefetched relations.
+        """
+        for related in self.related:
+            name = related.name
+            missing = []
+            for i, (pk, item) in enumerate(data):
+                cache = getattr(objects[i], '_prefetched_objects_cache',
+                                None) if objects is not None else None
+                if cache is not None and name in cache:
+                    item[name] = [convert_pk(obj._get_pk_val())
+                                  for obj in cache[name]]
+                else:
+                    missing.append((pk, item))
+            if not missing:
+                continue
+            related_pks = related.fetch([pk for pk, item in missing])
+            for pk, item in missing:
+                item[name] = related_pks.get(pk, [])
+
+    def serialize_objects(self, objects):
+        data = []
+        for obj in objects:
+            item = OrderedDict()
+            item['pk'] = convert_pk(obj._get_pk_val())
+            for field in self.fields:
+                value = field.value_from_object(obj)
+                if not is_protected_type(value):
+                    value = field.value_to_string(obj)
+                item[field.name] = value
+            for name, field in self.lookups:
+                item[name] = self.get_lookup_value(obj, name, field)
+            data.append((obj._get_pk_val(), item))
+        self.add_related_values(data, objects)
+        return [item for pk, item in data]
+
+    def get_lookup_value(self, obj, lookup, field):
+        for name in lookup.split(LOOKUP_SEP)[:-1]:
+            obj = getattr(obj, name)
+            if obj is None:
+                return None
+        value = field.value_from_object(obj)
+        if not is_protected_type(value):
+            value = field.value_to_string(obj)
+        return value
+
+    def restrict_queryset(self, queryset):
+        """
+        Return the queryset which loads only columns of the serialized
+        fields and selects related objects of the lookups
+        """
+        related = set(name.rsplit(LOOKUP_SEP, 1)[0]
+                      for name, field in self.lookups)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*[field.name for field in self.fields] +
+                             [name for name, field in self.lookups] or
+                             ['pk'])
+
+
+_plans = {}
+
+
+def get_serialization_plan(model, fields=None, relations=None):
+    """
+    Return cached serialization plan of the model and the fields. Plans
+    do not depend on order of the fields, so their number is bounded.
+    """
+    key = (model,
+           frozenset(fields) if fields is not None else None,
+           tuple(relations) if relations is not None else None)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = SerializationPlan(*key)
+    return plan
+
+
+def restrict_queryset(queryset, fields, relations=None):
+    """
+    Return the queryset which loads only columns required to serialize
+    the `fields`
+    """
+    plan = get_serialization_plan(queryset.model, fields, relations)
+    return plan.restrict_queryset(queryset)
+
+
+def serialize_objects(objects, fields=None, relations=None):
+    data = []
+    for model, group in itertools.groupby(objects, lambda obj: obj.__class__):
+        plan = get_serialization_plan(model, fields, relations)
+        data.extend(plan.serialize_objects(list(group)))
+    return data
+
+
+def get_values_plan(queryset, fields=None, relations=None):
+    """
+    Return serialization plan of the queryset if it can be serialized by
+    `values_list()` query
+    """
+    if isinstance(queryset, QuerySet) and queryset._fields is None and \
+            queryset._result_cache is None and \
+            not queryset._prefetch_related_lookups:
+        plan = get_serialization_plan(queryset.model, fields, relations)
+        if plan.use_values:
+            return plan
+    return None
+
+
+def iter_serialize(objects, fields=None, chunk_size=SERIALIZE_CHUNK_SIZE,
+                   relations=None):
+    """
+    Iterate over chunks (lists) of serialized objects. Querysets are read
+    from the database by `iterator()`.
+    """
+    plan = get_values_plan(objects, fields, relations)
+    if plan is not None:
+        for chunk in plan.iter_values(objects, chunk_size):
+            yield chunk
+        return
+    if isinstance(objects, QuerySet) and objects._result_cache is None and \
+            not objects._prefetch_related_lookups:
+        objects = objects.iterator()
+    objects = iter(objects)
+    while True:
+        chunk = serialize_objects(itertools.islice(objects, chunk_size),
+                                  fields, relations)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_json_lines(chunks, encoder=None):
+    """
+    Encode chunks of serialized objects into JSON Lines (NDJSON), one
+    object per line
+    """
+    dumps = get_encoder(encoder)
+    for chunk in chunks:
+        if chunk:
+            yield b''.join([dumps(item) + b'\n' for item in chunk])
+
+
+def iter_ndjson(objects, fields=None, chunk_size=SERIALIZE_CHUNK_SIZE,
+                relations=None, encoder=None):
+    """
+    Iterate over JSON Lines of serialized objects. Querysets are read from
+    the database by `iterator()`, so memory usage does not depend on size
+    of the queryset.
+    """
+    return iter_json_lines(iter_serialize(objects, fields, chunk_size,
+                                          relations), encoder)
+
+
 def simple_serialize(queryset, context=None, **options):
     """
     Serialize a queryset (or any iterator that returns database objects) using
     a certain serializer.
+
+    Not evaluated querysets are serialized by `values_list()` query without
+    creating model instances. `relations` option is the list of reverse
+    relations serialized as lists of pks. `PythonSerializer` is used for
+    options other than `fields` and `relations`.
     """
-    s = PythonSerializer()
-    s.serialize(queryset, **options)
-    return s.getvalue()
+    if set(options) - set(['fields', 'relations']):
+        s = PythonSerializer()
+        s.serialize(queryset, **options)
+        return s.getvalue()
+
+    fields = options.get('fields')
+    relations = options.get('relations')
+    plan = get_values_plan(queryset, fields, relations)
+    if plan is not None:
+        return plan.serialize_values(queryset)
+    return serialize_objects(queryset, fields, relations)
 
 
-def serialize(obj, serializer_class=None, many=False, context=None):
+def serialize(obj, serializer_class=None, many=False, context=None,
+              **options):
     """
     Serialize an object or queryset (or any iterator that returns database objects)
     using serializer from Djangp REST Framework or our `simple_serialize`
-    function
+    function, `options` are passed to `simple_serialize`
     """
     if serializer_class is None:
         if not many:
             obj = [obj, ]
-        return simple_serialize(obj, context=context)
+        return simple_serialize(obj, context=context, **options)
     if inspect.isclass(serializer_class):
         serializer = serializer_class(obj, many=many, context=context)
         return serializer.data
@@ -1,5 +1,8 @@
 # coding: utf-8
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.constants import LOOKUP_SEP
 from django.shortcuts import _get_queryset
+from django.utils.http import parse_etags, quote_etag, parse_http_date_safe
 
 
 def get_object_or_None(klass, *args, **kwargs):
@@ -14,3 +17,84 @@ def get_object_or_None(klass, *args, **kwargs):
         )
     except queryset.model.DoesNotExist:
         return None
+
+
+def is_not_modified(request, etag=None, last_modified=None):
+    """
+    Check conditional GET headers of the request. Return True if the copy
+    of the client is the same as the resource with `etag` (not quoted) or
+    `last_modified` timestamp.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and etag is not None:
+        etags = parse_etags(if_none_match)
+        # weak comparison, compressed responses have weak etags
+        return '*' in etags or etag in etags or \
+            quote_etag(etag) in etags or 'W/' + quote_etag(etag) in etags
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified is not None:
+        since = parse_http_date_safe(if_modified_since)
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def parse_quality_values(header):
+    """
+    Return mapping of the values of `Accept` like header to their quality
+    """
+    values = {}
+    for item in header.split(','):
+        params = item.strip().split(';')
+        name = params[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        values[name] = quality
+    return values
+
+
+def get_media_type_quality(accepted, media_type):
+    """
+    Return quality of the media type in `accepted` mapping of `Accept`
+    header values, the most specific matching media range is used
+    """
+    media_range = media_type.split('/')[0] + '/*'
+    for name in (media_type, media_range, '*/*'):
+        if name in accepted:
+            return accepted[name]
+    return 0
+
+
+def get_lookup_field(model, lookup):
+    """
+    Return concrete model field referenced by `lookup` which can follow
+    relations (`author__name`) or be attname of the foreign key
+    (`author_id`). Return None if there is no such field.
+    """
+    field = None
+    for name in lookup.split(LOOKUP_SEP):
+        if model is None:
+            return None
+        if name == 'pk':
+            field = model._meta.pk
+            model = None
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            for field in model._meta.concrete_fields:
+                if field.attname == name:
+                    break
+            else:
+                return None
+        model = field.related_model if field.is_relation else None
+    if not getattr(field, 'concrete', False):
+        return None
+    return field
@@ -2,82 +2,690 @@
 
 import StringIO
 import datetime
+import decimal
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
 
+from django.apps import apps
+from django.db import connections, models
+from django.db.models import Max, Min
 from django.db.models.query import QuerySet
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.encoding import force_text
+
+from ..compress import gzip_stream
+from ..jobs import close_connections
+from ..utils import get_lookup_field
+
+
+# number of rows encoded together and sent to the client as one chunk
+STREAM_CHUNK_SIZE = 1000
+
+# size of chunks of files sent to the client
+FILE_CHUNK_SIZE = 64 * 1024
+
+# rows limits of a single sheet
+XLS_MAX_ROWS = 65536
+XLSX_MAX_ROWS = 1048576
+
+# max length of the sheet name allowed by Excel
+SHEET_TITLE_MAX_LENGTH = 31
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+CELL_FORMATS = {
+    'datetime': 'yyyy-mm-dd hh:mm:ss',
+    'date': 'yyyy-mm-dd',
+    'time': 'hh:mm:ss',
+}
+
+# types which can be written into the xlsx cell as is
+XLSX_NATIVE_TYPES = (basestring, bool, int, long, float, decimal.Decimal,
+                     datetime.date, datetime.time, type(None))
+
+# connections inherited by the worker processes, they are never closed
+_inherited_connections = []
+
+# model fields which values never contain quotes in the csv
+UNQUOTED_FIELDS = (models.AutoField, models.IntegerField, models.FloatField,
+                   models.DecimalField, models.BooleanField,
+                   models.NullBooleanField, models.DateField,
+                   models.TimeField)
+
+
+def get_cell_style_name(value):
+    if isinstance(value, datetime.datetime):
+        return 'datetime'
+    elif isinstance(value, datetime.date):
+        return 'date'
+    elif isinstance(value, datetime.time):
+        return 'time'
+    return 'default'
+
+
+def encode_csv_row(row, encoding='utf8'):
+    out_row = []
+    for value in row:
+        if not isinstance(value, basestring):
+            value = unicode(value)
+        value = value.encode(encoding)
+        out_row.append(value.replace('"', '""'))
+    return '"%s"\n' % '","'.join(out_row)
+
+
+class Column(object):
+    """
+    Describe how values of one column are written into the cells.
+
+    `converter` is applied to every value of the column, `style` is a key
+    of `CELL_FORMATS` or 'default'. When `style` is None it is detected
+    by the type of every value. Values of the column with `quoted=False`
+    are never escaped in csv, use it for numbers and dates.
+    """
+
+    def __init__(self, name=None, converter=None, style=None, quoted=True):
+        self.name = name
+        self.converter = converter
+        self.style = style
+        self.quoted = quoted
+
+    @classmethod
+    def for_field(cls, field, name=None, display_choices=False):
+        if name is None:
+            name = field.attname
+        if display_choices and field.choices:
+            choices = dict((key, force_text(value))
+                           for key, value in field.flatchoices)
+            return cls(name, converter=lambda value: choices.get(value, value),
+                       style='default')
+        if field.many_to_one or field.one_to_one:
+            # foreign key values are the values of the target field
+            return cls.for_field(field.target_field, name)
+        if isinstance(field, models.DateTimeField):
+            style = 'datetime'
+        elif isinstance(field, models.DateField):
+            style = 'date'
+        elif isinstance(field, models.TimeField):
+            style = 'time'
+        else:
+            style = 'default'
+        return cls(name, style=style,
+                   quoted=not isinstance(field, UNQUOTED_FIELDS))
+
+    def get_csv_encoder(self, encoding):
+        """
+        Return function which converts value of the column into the
+        escaped bytes of the csv cell
+        """
+        if self.quoted:
+            def encode(value):
+                if not isinstance(value, basestring):
+                    value = unicode(value)
+                return value.encode(encoding).replace('"', '""')
+        else:
+            encode = str
+        convert = self.converter
+        if convert is None:
+            return encode
+        return lambda value: encode(convert(value))
+
+
+class ColumnSchema(object):
+    """
+    Columns of the exported table. Converters and styles are resolved once
+    for every column and applied to the rows by batches.
+    """
+
+    def __init__(self, columns, headers=None):
+        self.columns = list(columns)
+        self.headers = headers
+
+    @classmethod
+    def for_model(cls, model, names, display_choices=False):
+        columns = []
+        for name in names:
+            field = get_lookup_field(model, name)
+            if field is None:
+                columns.append(Column(name))
+            else:
+                columns.append(Column.for_field(field, name, display_choices))
+        return cls(columns, names)
+
+    def iter_batches(self, rows, batch_size=STREAM_CHUNK_SIZE):
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            yield batch
+
+    def iter_csv(self, rows, encoding='utf8', batch_size=STREAM_CHUNK_SIZE):
+        """
+        Iterate over encoded csv chunks, the headers line is the first chunk
+        """
+        if self.headers is not None:
+            yield encode_csv_row(self.headers, encoding)
+        encoders = [column.get_csv_encoder(encoding)
+                    for column in self.columns]
+        for batch in self.iter_batches(rows, batch_size):
+            yield ''.join([
+                '"%s"\n' % '","'.join([encode(value) for encode, value
+                                       in zip(encoders, row)])
+                for row in batch
+            ])
+
+    def iter_cells(self, rows, styles, batch_size=STREAM_CHUNK_SIZE):
+        """
+        Iterate over rows of cells as lists of (value, style) pairs. Style
+        is taken from `styles` mapping of style names.
+        """
+        converters = [column.converter for column in self.columns]
+        cell_styles = [styles[column.style] if column.style is not None
+                       else None for column in self.columns]
+        convert_values = any(convert is not None for convert in converters)
+        detect_styles = None in cell_styles
+        for batch in self.iter_batches(rows, batch_size):
+            for row in batch:
+                if convert_values:
+                    row = [value if convert is None else convert(value)
+                           for convert, value in zip(converters, row)]
+                if detect_styles:
+                    yield [(value, styles[get_cell_style_name(value)]
+                            if style is None else style)
+                           for style, value in zip(cell_styles, row)]
+                else:
+                    # styles of all columns are known, pairs are built in C
+                    yield zip(row, cell_styles)
+
+
+def get_table(data, headers=None, columns=None, display_choices=False,
+              exclude=None):
+    """
+    Return the column schema of `data` and iterator over its rows.
+
+    QuerySets are read from the database with `iterator()`, so rows are
+    fetched in chunks and never cached on the queryset. Only columns
+    from `headers` are selected, they can follow relations
+    (`author__name`). Without `headers` all concrete fields except of
+    `exclude` names are selected. Columns of the querysets are described
+    by the model fields.
+    """
+    model = None
+    if isinstance(data, QuerySet):
+        model = data.model
+        if headers is None and exclude:
+            headers = [field.attname for field in model._meta.concrete_fields
+                       if field.name not in exclude and
+                       field.attname not in exclude]
+        if headers is None:
+            data = data.values().iterator()
+        else:
+            data = data.values_list(*headers).iterator()
+    rows = iter(data)
+    for first in rows:
+        break
+    else:
+        return ColumnSchema([]), iter(())
+    rows = itertools.chain([first], rows)
+    if isinstance(first, dict):
+        if headers is None:
+            headers = list(first.keys())
+        rows = ([row[col] for col in headers] for row in rows)
+
+    if columns is not None:
+        schema = ColumnSchema(columns, headers)
+    elif model is not None:
+        schema = ColumnSchema.for_model(model, headers, display_choices)
+    elif headers is not None:
+        schema = ColumnSchema([Column(name) for name in headers], headers)
+    else:
+        schema = ColumnSchema([Column() for value in first])
+    return schema, rows
+
+
+def is_ordered_by_pk(queryset):
+    """
+    Return True if the queryset is not ordered or is ordered by the
+    primary key ascending
+    """
+    query = queryset.query
+    if query.extra_order_by:
+        return False
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering:
+        ordering = queryset.model._meta.ordering
+    else:
+        ordering = []
+    pk = queryset.model._meta.pk
+    return all(isinstance(name, basestring) and
+               name in ('pk', pk.name, pk.attname) for name in ordering)
+
+
+def get_pk_ranges(queryset, shards):
+    """
+    Split the queryset into `shards` ranges of the integer primary key.
+    Return list of (first, last) pairs, `last` is not included, or None
+    if the queryset can not be split.
+    """
+    if queryset.query.low_mark or queryset.query.high_mark is not None:
+        # sliced querysets can not be filtered
+        return None
+    if not is_ordered_by_pk(queryset):
+        # shards are sent in order of the primary key
+        return None
+    bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+    first, last = bounds['first'], bounds['last']
+    if first is None:
+        return []
+    if not isinstance(first, (int, long)):
+        return None
+    step = (last - first) // shards + 1
+    return [(pk, min(pk + step, last + 1))
+            for pk in range(first, last + 1, step)]
+
+
+def drop_inherited_connections():
+    """
+    Forget database connections inherited by the forked worker process.
+    They share sockets with the parent process, so they are not closed
+    (it would break the transaction of the parent) but kept until the
+    worker exits, and the worker opens its own connections.
+    """
+    for conn in connections.all():
+        if conn.connection is not None:
+            _inherited_connections.append(conn.connection)
+            conn.connection = None
+
+
+def export_csv_shard(args):
+    """
+    Write the shard of the queryset into the csv file in the `location`
+    directory without the headers line and return path of the file.
+    It is called in the worker process.
+    """
+    model_label, using, query, headers, first, last, encoding, location, \
+        display_choices = args
+    queryset = QuerySet(model=apps.get_model(model_label), query=query,
+                        using=using)
+    queryset = queryset.filter(pk__gte=first, pk__lt=last).order_by('pk')
+    schema, rows = get_table(queryset, headers,
+                             display_choices=display_choices)
+    schema.headers = None
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=location)
+    with os.fdopen(fd, 'wb') as output:
+        for chunk in schema.iter_csv(rows, encoding):
+            output.write(chunk)
+    return path
+
+
+def iter_parallel_csv(queryset, headers=None, exclude=None, encoding='utf8',
+                      processes=None, shards=None, display_choices=False):
+    """
+    Export the queryset into the csv by the pool of worker processes.
+
+    The queryset is split into shards by ranges of the primary key, every
+    shard is encoded by the worker into its own temporary file. Files are
+    sent in order of the shards as soon as they are ready, so rows are
+    ordered by the primary key. Querysets which can not be split (sliced,
+    ordered by other fields or with not integer pks) are exported in the
+    current process.
+
+    Workers use their own database connections, so they don't see changes
+    not committed by the current transaction.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if shards is None:
+        shards = processes * 4
+    if headers is None:
+        exclude = exclude or ()
+        headers = [field.attname
+                   for field in queryset.model._meta.concrete_fields
+                   if field.name not in exclude and
+                   field.attname not in exclude]
+    ranges = get_pk_ranges(queryset, shards)
+    if ranges is None:
+        schema, rows = get_table(queryset, headers,
+                                 display_choices=display_choices)
+        for chunk in schema.iter_csv(rows, encoding):
+            yield chunk
+        return
+
+    yield encode_csv_row(headers, encoding)
+    location = tempfile.mkdtemp()
+    pool = multiprocessing.Pool(processes, drop_inherited_connections)
+    try:
+        tasks = [(queryset.model._meta.label, queryset.db, queryset.query,
+                  headers, first, last, encoding, location, display_choices)
+                 for first, last in ranges]
+        for path in pool.imap(export_csv_shard, tasks):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), ''):
+                    yield chunk
+            os.remove(path)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(location, ignore_errors=True)
+
+
+def get_sheet_title(title, number):
+    """
+    Return the title of the `number` sheet (starts from 1) for data split
+    across several sheets.
+    """
+    if number == 1:
+        return title[:SHEET_TITLE_MAX_LENGTH]
+    suffix = u' (%d)' % number
+    return title[:SHEET_TITLE_MAX_LENGTH - len(suffix)] + suffix
+
+
+def has_xlsx_support():
+    try:
+        import xlsxwriter  # NOQA
+    except ImportError:
+        return False
+    return True
+
+
+def get_xls_workbook(encoding='utf8'):
+    """
+    Return new xlwt workbook and its cell styles
+    """
+    import xlwt
+
+    book = xlwt.Workbook(encoding=encoding)
+    styles = dict((name, xlwt.easyxf(num_format_str=num_format))
+                  for name, num_format in CELL_FORMATS.items())
+    styles['default'] = xlwt.Style.default_style
+    return book, styles
+
+
+def write_xls_sheet(book, styles, schema, rows, sheet_title='Sheet 1'):
+    sheet = book.add_sheet(get_sheet_title(sheet_title, 1))
+    rowx = 0
+    if schema.headers is not None:
+        for colx, value in enumerate(schema.headers):
+            sheet.write(rowx, colx, value, style=styles['default'])
+        rowx += 1
+    for row in schema.iter_cells(rows, styles):
+        for colx, (value, cell_style) in enumerate(row):
+            sheet.write(rowx, colx, value, style=cell_style)
+        rowx += 1
+
+
+def write_xls(schema, rows, output, sheet_title='Sheet 1', encoding='utf8'):
+    book, styles = get_xls_workbook(encoding)
+    write_xls_sheet(book, styles, schema, rows, sheet_title)
+    book.save(output)
+
+
+def get_xlsx_workbook(output):
+    """
+    Return new xlsxwriter workbook writing into `output` and its cell
+    styles. Workbook is written in xlsxwriter constant memory mode: every
+    row is flushed to the temporary file of the sheet as soon as the next
+    row is started, so memory usage does not depend on the number of rows.
+    """
+    import xlsxwriter
+
+    book = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'remove_timezone': True,
+    })
+    styles = dict((name, book.add_format({'num_format': num_format}))
+                  for name, num_format in CELL_FORMATS.items())
+    styles['default'] = None
+    return book, styles
+
+
+def write_xlsx_sheets(book, styles, schema, rows, sheet_title='Sheet 1'):
+    """
+    Write rows into the new sheet of the xlsx workbook. Rows which don't
+    fit into the one sheet go to the next sheets, the headers row is
+    repeated at the top of every sheet.
+    """
+    sheet = None
+    sheet_number = 0
+    rowx = XLSX_MAX_ROWS
+    for row in itertools.chain([None], schema.iter_cells(rows, styles)):
+        if rowx >= XLSX_MAX_ROWS:
+            sheet_number += 1
+            sheet = book.add_worksheet(get_sheet_title(sheet_title,
+                                                       sheet_number))
+            rowx = 0
+            if schema.headers is not None:
+                for colx, value in enumerate(schema.headers):
+                    sheet.write(rowx, colx, value)
+                rowx += 1
+        if row is None:
+            continue
+        for colx, (value, cell_style) in enumerate(row):
+            if not isinstance(value, XLSX_NATIVE_TYPES):
+                value = unicode(value)
+            sheet.write(rowx, colx, value, cell_style)
+        rowx += 1
+
+
+def write_xlsx(schema, rows, output, sheet_title='Sheet 1'):
+    """
+    Write rows into `output` as xlsx workbook
+    """
+    book, styles = get_xlsx_workbook(output)
+    write_xlsx_sheets(book, styles, schema, rows, sheet_title)
+    book.close()
+
+
+def load_sheets(sheets, headers=None, threads=None):
+    """
+    Return list of (title, schema, rows) of the sheets. Data of all sheets
+    is evaluated concurrently by the pool of threads, every thread uses
+    its own database connections, so it does not see changes not
+    committed by the current transaction. Single sheet is loaded in the
+    current thread.
+    """
+    if hasattr(sheets, 'items'):
+        sheets = sheets.items()
+    sheets = list(sheets)
+    headers = headers or {}
+
+    def load(sheet):
+        title, data = sheet
+        schema, rows = get_table(data, headers.get(title))
+        return title, schema, list(rows)
+
+    def load_in_thread(sheet):
+        try:
+            return load(sheet)
+        finally:
+            # connections of the pool thread
+            close_connections()
+
+    if threads is None:
+        threads = len(sheets)
+    if threads <= 1 or len(sheets) <= 1:
+        return [load(sheet) for sheet in sheets]
+    pool = ThreadPool(min(threads, len(sheets)))
+    try:
+        return pool.map(load_in_thread, sheets)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_content_disposition(output_name, file_ext):
+    return 'attachment;filename="%s.%s"' % \
+        (output_name.replace('"', '\"'), file_ext)
 
 
 class ExcelResponse(HttpResponse):
+    """
+    Excel workbook or csv file of `data`. With `display_choices=True`
+    fields with choices of the exported querysets are written as their
+    display values.
+    """
 
     def __init__(self, data, output_name='excel_data', headers=None,
                  force_csv=False, encoding='utf8',
-                 sheet_title='Sheet 1'):
+                 sheet_title='Sheet 1', force_xls=False, columns=None,
+                 exclude=None, display_choices=False):
 
-        # Make sure we've got the right type of data to work with
-        valid_data = False
-        if isinstance(data, QuerySet):
-            data = list(data.values())
-        else:
-            data = list(data)
-        if hasattr(data, '__getitem__') and len(data):
-            if isinstance(data[0], dict):
-                if headers is None:
-                    headers = data[0].keys()
-                data = [[row[col] for col in headers] for row in data]
-                data.insert(0, headers)
-            else:
-                data.insert(0, headers)
-            if hasattr(data[0], '__getitem__'):
-                valid_data = True
-        # assert valid_data is True, "ExcelResponse requires a sequence of sequences"
+        schema, rows = get_table(data, headers, columns, display_choices,
+                                 exclude)
+
+        if force_csv is not True and force_xls is not True and \
+                has_xlsx_support():
+            output = tempfile.TemporaryFile()
+            write_xlsx(schema, rows, output, sheet_title)
+            output.seek(0)
+            super(ExcelResponse, self).__init__(content=output.read(),
+                                                content_type=XLSX_MIMETYPE)
+            output.close()
+            self['Content-Disposition'] = get_content_disposition(
+                output_name, 'xlsx')
+            return
+
+        rows = list(rows)
+        rows_count = len(rows)
+        if schema.headers is not None:
+            rows_count += 1
 
         output = StringIO.StringIO()
         # Excel has a limit on number of rows; if we have more than that, make a csv
         use_xls = False
-        if len(data) <= 65536 and force_csv is not True:
+        if rows_count <= XLS_MAX_ROWS and force_csv is not True:
             try:
-                import xlwt
+                import xlwt  # NOQA
             except ImportError:
                 # xlwt doesn't exist; fall back to csv
                 pass
             else:
                 use_xls = True
         if use_xls:
-            book = xlwt.Workbook(encoding=encoding)
-            sheet = book.add_sheet(sheet_title)
-            styles = {
-                'datetime': xlwt.easyxf(num_format_str='yyyy-mm-dd hh:mm:ss'),
-                'date': xlwt.easyxf(num_format_str='yyyy-mm-dd'),
-                'time': xlwt.easyxf(num_format_str='hh:mm:ss'),
-                'default': xlwt.Style.default_style
-            }
-            for rowx, row in enumerate(data):
-                for colx, value in enumerate(row):
-                    if isinstance(value, datetime.datetime):
-                        cell_style = styles['datetime']
-                    elif isinstance(value, datetime.date):
-                        cell_style = styles['date']
-                    elif isinstance(value, datetime.time):
-                        cell_style = styles['time']
-                    else:
-                        cell_style = styles['default']
-                    sheet.write(rowx, colx, value, style=cell_style)
-            book.save(output)
+            write_xls(schema, rows, output, sheet_title, encoding)
             mimetype = 'application/vnd.ms-excel'
             file_ext = 'xls'
         else:
-            for row in data:
-                out_row = []
-                for value in row:
-                    if not isinstance(value, basestring):
-                        value = unicode(value)
-                    value = value.encode(encoding)
-                    out_row.append(value.replace('"', '""'))
-                output.write('"%s"\n' % '","'.join(out_row))
+            for chunk in schema.iter_csv(rows, encoding):
+                output.write(chunk)
             mimetype = 'text/csv'
             file_ext = 'csv'
         output.seek(0)
         super(ExcelResponse, self).__init__(content=output.getvalue(),
                                             content_type=mimetype)
-        self['Content-Disposition'] = 'attachment;filename="%s.%s"' % \
-            (output_name.replace('"', '\"'), file_ext)
+        self['Content-Disposition'] = get_content_disposition(output_name,
+                                                              file_ext)
+
+
+class StreamingExcelResponse(StreamingHttpResponse):
+    """
+    Flavour of `ExcelResponse` which sends data to the client while rows
+    are read from the database. Memory usage does not depend on the number
+    of exported rows.
+
+    CSV lines are sent as soon as they are encoded. XLSX workbook can not
+    be sent before it is completed, so it is written into a temporary file
+    first and then the file is sent by chunks.
+
+    CSV exports of querysets with `processes` set are encoded in parallel
+    by the pool of worker processes, see `iter_parallel_csv`.
+
+    CSV exports with `compress=True` are sent as gzipped `.csv.gz` files,
+    use `extra_cbv.compress.compress_response` to compress the response
+    by `Accept-Encoding` of the request instead.
+    """
+
+    def __init__(self, data, output_name='excel_data', headers=None,
+                 encoding='utf8', chunk_size=STREAM_CHUNK_SIZE,
+                 file_format='csv', sheet_title='Sheet 1', columns=None,
+                 exclude=None, processes=None, shards=None, compress=False,
+                 display_choices=False):
+        if file_format == 'xlsx':
+            content = self.iter_xlsx(data, headers, columns, exclude,
+                                     sheet_title, display_choices)
+            mimetype = XLSX_MIMETYPE
+        elif processes is not None and isinstance(data, QuerySet) and \
+                columns is None:
+            content = iter_parallel_csv(data, headers, exclude, encoding,
+                                        processes, shards, display_choices)
+            mimetype = 'text/csv'
+            file_format = 'csv'
+        else:
+            content = self.iter_csv(data, headers, columns, exclude,
+                                    encoding, chunk_size, display_choices)
+            mimetype = 'text/csv'
+            file_format = 'csv'
+        if compress and file_format == 'csv':
+            content = gzip_stream(content)
+            mimetype = 'application/gzip'
+            file_format = 'csv.gz'
+        super(StreamingExcelResponse, self).__init__(
+            streaming_content=content, content_type=mimetype)
+        self['Content-Disposition'] = get_content_disposition(output_name,
+                                                              file_format)
+
+    def iter_xlsx(self, data, headers, columns, exclude, sheet_title,
+                  display_choices=False):
+        output = tempfile.TemporaryFile()
+        try:
+            schema, rows = get_table(data, headers, columns, display_choices,
+                                     exclude)
+            write_xlsx(schema, rows, output, sheet_title)
+            output.seek(0)
+            for chunk in iter(lambda: output.read(FILE_CHUNK_SIZE), ''):
+                yield chunk
+        finally:
+            output.close()
+
+    def iter_csv(self, data, headers, columns, exclude, encoding,
+                 chunk_size, display_choices=False):
+        schema, rows = get_table(data, headers, columns, display_choices,
+                                 exclude)
+        for chunk in schema.iter_csv(rows, encoding, chunk_size):
+            yield chunk
+
+
+class WorkbookResponse(HttpResponse):
+    """
+    Excel workbook with a sheet for every item of `sheets`, which is an
+    ordered mapping or list of (sheet title, data) pairs. `headers` is
+    a mapping of sheet titles to headers of their data.
+
+    Data of the sheets is independent, so querysets are evaluated
+    concurrently by the pool of `threads` threads (one per sheet by
+    default) and the total time is about the time of the slowest query.
+    """
+
+    def __init__(self, sheets, output_name='excel_data', headers=None,
+                 encoding='utf8', force_xls=False, threads=None):
+        tables = load_sheets(sheets, headers, threads)
+        if force_xls is not True and has_xlsx_support():
+            output = tempfile.TemporaryFile()
+            book, styles = get_xlsx_workbook(output)
+            for title, schema, rows in tables:
+                write_xlsx_sheets(book, styles, schema, rows, title)
+            book.close()
+            output.seek(0)
+            content = output.read()
+            output.close()
+            mimetype = XLSX_MIMETYPE
+            file_ext = 'xlsx'
+        else:
+            output = StringIO.StringIO()
+            book, styles = get_xls_workbook(encoding)
+            for title, schema, rows in tables:
+                write_xls_sheet(book, styles, schema, rows, title)
+            book.save(output)
+            content = output.getvalue()
+            mimetype = 'application/vnd.ms-excel'
+            file_ext = 'xls'
+        super(WorkbookResponse, self).__init__(content=content,
+                                               content_type=mimetype)
+        self['Content-Disposition'] = get_content_disposition(output_name,
+                                                              file_ext)
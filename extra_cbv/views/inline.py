@@ -11,12 +11,20 @@ from django.views.generic.edit import CreateView, FormMixin, UpdateView
 from django.views.generic.list import ListView
 from django.utils.translation import ugettext_lazy as _
 
+from ..cache import get_queryset_key, track_models
+from ..identity import load_object
+
 
 __all__ = ['InlineListView', 'CreateView', 'InlineUpdateView']
 
 
 class InlineMixin(object):
+    """
+    Master object is loaded once per request. With `master_cache_timeout`
+    it is cached across requests until the master model is changed.
+    """
     master_model = None
+    master_cache_timeout = None
     context_master_object_name = None
 
     # like Django SingleObjectMixin
@@ -25,6 +33,15 @@ class InlineMixin(object):
     master_pk_url_kwarg = 'pk'
     master_query_pk_and_slug = False
 
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(InlineMixin, cls).as_view(**initkwargs)
+        master_model = initkwargs.get('master_model', cls.master_model)
+        if master_model is not None and initkwargs.get(
+                'master_cache_timeout', cls.master_cache_timeout):
+            track_models([master_model])
+        return view
+
     def get_master_object_queryset(self):
         return self.master_model._default_manager.all()
 
@@ -51,7 +68,9 @@ class InlineMixin(object):
 
         try:
             # Get the single item from the filtered queryset
-            obj = queryset.get()
+            obj = load_object(self.request, get_queryset_key(queryset),
+                              queryset.get, queryset.model,
+                              self.master_cache_timeout)
         except queryset.model.DoesNotExist:
             raise Http404(_("No %(verbose_name)s found matching the query") %
                           {'verbose_name': queryset.model._meta.verbose_name})
@@ -139,7 +158,11 @@ class InlineUpdateView(InlineFormMixin, UpdateView):
         if queryset is None:
             queryset = self.get_queryset()
         queryset = queryset.filter(**self.get_lookup())
-        return UpdateView.get_object(self, queryset)
+        key = get_queryset_key(queryset, self.slug_field,
+                               sorted(self.kwargs.items()))
+        return load_object(self.request, key,
+                           lambda: UpdateView.get_object(self, queryset),
+                           queryset.model)
 
     def get_lookup(self):
         if self.master_field_name is None:
@@ -1,23 +1,140 @@
 # coding: utf-8
+import calendar
+import datetime
+import hashlib
 
-from django.http.response import JsonResponse
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseBadRequest, \
+    HttpResponseNotModified
+from django.http.response import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import force_bytes
+from django.utils.http import http_date, quote_etag
 from django.views.generic.base import View
 from django.views.generic.detail import BaseDetailView
 from django.views.generic.list import BaseListView
 
-from ..serializers import serialize
+from ..cache import get_model_versions, track_models
+from ..encoders import EncodedJsonResponse, JSON_MEDIA_TYPE, get_encoder, \
+    get_media_type_encoder, negotiate_media_type
+from ..pagination import CursorPage
+from ..serializers import serialize, iter_json_lines, iter_serialize, \
+    restrict_queryset, SERIALIZE_CHUNK_SIZE
+from ..utils import get_media_type_quality, is_not_modified, \
+    parse_quality_values
 
 
 class JsonMixin(object):
+    # name of the encoder from `extra_cbv.encoders` registry, the default
+    # encoder is used if it is None
+    json_encoder = None
+    # media types of the response negotiated by `Accept` header, the first
+    # one is the default. Not installed formats are skipped.
+    media_types = [JSON_MEDIA_TYPE, 'application/msgpack',
+                   'application/x-msgpack']
 
     def render_to_response(self, context, **response_kwargs):
         data = self.serialize_context(context)
-        return JsonResponse(data, **response_kwargs)
+        media_type = self.get_media_type()
+        if media_type == JSON_MEDIA_TYPE:
+            response = EncodedJsonResponse(data, encoder=self.json_encoder,
+                                           **response_kwargs)
+        else:
+            response_kwargs.setdefault('content_type', media_type)
+            encode = get_media_type_encoder(media_type, self.json_encoder)
+            response = HttpResponse(encode(data), **response_kwargs)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def get_media_type(self):
+        if not hasattr(self, '_media_type'):
+            self._media_type = negotiate_media_type(self.request,
+                                                    self.media_types)
+        return self._media_type
 
     def serialize_context(self, context):
         return {}
 
 
+class CacheResponseMixin(object):
+    """
+    Cache of JSON responses of `JsonMixin` views. Responses are cached by
+    the view, URL kwargs, GET parameters, the user (if `cache_per_user`)
+    and versions of `cache_models` data (the model of the view by
+    default). Versions are changed by save, delete and m2m changes signals
+    of the models, see `extra_cbv.cache.track_models`. Changes which don't
+    send signals are seen after `cache_timeout`. Streaming responses are
+    not cached.
+    """
+    cache_alias = 'default'
+    cache_timeout = 60 * 60
+    cache_models = None
+    cache_per_user = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(CacheResponseMixin, cls).as_view(**initkwargs)
+        # models are tracked before the first request, so changes made by
+        # other views of the process are seen
+        models = initkwargs.get('cache_models', cls.cache_models)
+        if models is None:
+            model = initkwargs.get('model', getattr(cls, 'model', None))
+            queryset = initkwargs.get('queryset',
+                                      getattr(cls, 'queryset', None))
+            if model is None and queryset is not None:
+                model = queryset.model
+            models = [model] if model is not None else []
+        track_models(models)
+        return view
+
+    def get(self, request, *args, **kwargs):
+        if getattr(self, 'is_ndjson', None) is not None and self.is_ndjson():
+            # NDJSON streams are not cached
+            return super(CacheResponseMixin, self).get(request, *args,
+                                                       **kwargs)
+        cache = caches[self.cache_alias]
+        key = self.get_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            patch_vary_headers(response, ('Accept',))
+            return response
+        response = super(CacheResponseMixin, self).get(request, *args,
+                                                       **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']),
+                      self.cache_timeout)
+        return response
+
+    def get_cache_models(self):
+        if self.cache_models is not None:
+            return self.cache_models
+        if getattr(self, 'model', None) is not None:
+            return [self.model]
+        return [self.get_queryset().model]
+
+    def get_cache_key_parts(self):
+        view = self.__class__
+        parts = [
+            '%s.%s' % (view.__module__, view.__name__),
+            sorted(self.kwargs.items()),
+            sorted(self.request.GET.lists()),
+            get_model_versions(self.get_cache_models()),
+            self.get_media_type(),
+        ]
+        if self.cache_per_user:
+            parts.append(getattr(getattr(self.request, 'user', None), 'pk',
+                                 None))
+        return parts
+
+    def get_cache_key(self):
+        return 'extra_cbv.response.%s' % hashlib.sha1(
+            force_bytes(repr(self.get_cache_key_parts()))).hexdigest()
+
+
 class JsonView(JsonMixin, View):
 
     def get(self, request, *args, **kwargs):
@@ -41,8 +158,15 @@ class SerializePaginationMixin(object):
 
     def get_pagination_data(self, context):
         """
-        Serialize django pagination data from context of ListView like views
+        Serialize django pagination data from context of ListView like views,
+        cursor pagination has cursor tokens instead of page numbers and has
+        not pages count
         """
+        if isinstance(context['page_obj'], CursorPage):
+            return {
+                "next": context['page_obj'].next_cursor,
+                "previous": context['page_obj'].previous_cursor,
+            }
         data = {
             "next": None,
             "previous": None,
@@ -55,14 +179,167 @@ class SerializePaginationMixin(object):
         return data
 
 
-class JsonListView(SerializePaginationMixin, JsonMixin, BaseListView):
+class SerializeFieldsMixin(object):
+    """
+    Selection of serialized fields when there is no serializer class.
+
+    The client requests the subset of `allowed_fields` by comma separated
+    `fields_kwarg` GET parameter, other fields are ignored. Fields can be
+    related lookups like `author__name`. The queryset loads only columns
+    of the requested fields and selects related objects of the lookups.
+
+    `serialize_relations` is the list of reverse relations serialized as
+    lists of pks.
+    """
+    allowed_fields = None
+    fields_kwarg = 'fields'
+    serialize_relations = None
+
+    def get_fields(self):
+        """
+        Return list of requested fields in order of `allowed_fields` or None
+        to serialize all fields
+        """
+        if self.allowed_fields is None:
+            return None
+        value = self.request.GET.get(self.fields_kwarg)
+        if not value:
+            return None
+        requested = set(name.strip() for name in value.split(','))
+        return [name for name in self.allowed_fields if name in requested]
+
+    def get_serialize_options(self):
+        options = {}
+        fields = self.get_fields()
+        if fields is not None:
+            options['fields'] = fields
+        if self.serialize_relations is not None:
+            options['relations'] = self.serialize_relations
+        return options
+
+    def get_queryset(self):
+        queryset = super(SerializeFieldsMixin, self).get_queryset()
+        fields = self.get_fields()
+        if fields is not None and self.get_serializer() is None:
+            queryset = restrict_queryset(queryset, fields,
+                                         self.serialize_relations)
+        return queryset
 
     def get_serializer(self):
         return None
 
+
+class JsonListView(SerializePaginationMixin, SerializeFieldsMixin, JsonMixin,
+                   BaseListView):
+    """
+    With `stream = True` the response is streamed: other keys of the
+    context (pagination etc.) are sent first, then the objects list is
+    sent by chunks of `stream_chunk_size` serialized objects while the
+    queryset is read from the database by `iterator()`.
+
+    With `ndjson = True` or `application/x-ndjson` in Accept header the
+    whole queryset is streamed without pagination as JSON Lines, one object
+    per line in order of `since_field`. Bulk loading is resumed by
+    `since_kwarg` GET parameter: objects with `since_field` greater than
+    its value are sent. `since_field` must be unique.
+    """
+    stream = False
+    stream_chunk_size = SERIALIZE_CHUNK_SIZE
+    ndjson = False
+    since_kwarg = 'since'
+    since_field = 'pk'
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_ndjson():
+            return super(JsonListView, self).get(request, *args, **kwargs)
+        try:
+            queryset = self.get_ndjson_queryset()
+        except (TypeError, ValueError, ValidationError):
+            return HttpResponseBadRequest()
+        response = self.render_to_ndjson_response(queryset)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def is_ndjson(self):
+        if self.ndjson:
+            return True
+        # NDJSON must be requested explicitly and not be less preferred
+        # than JSON
+        accepted = parse_quality_values(self.request.META.get('HTTP_ACCEPT',
+                                                              ''))
+        quality = accepted.get('application/x-ndjson', 0)
+        return quality > 0 and \
+            quality >= get_media_type_quality(accepted, JSON_MEDIA_TYPE)
+
+    def get_ndjson_queryset(self):
+        queryset = self.get_queryset()
+        since = self.request.GET.get(self.since_kwarg)
+        if since:
+            queryset = queryset.filter(**{'%s__gt' % self.since_field: since})
+        return queryset.order_by(self.since_field)
+
+    def render_to_ndjson_response(self, queryset, **response_kwargs):
+        response_kwargs.setdefault('content_type', 'application/x-ndjson')
+        chunks = self.iter_serialize_object_list(queryset, {'view': self})
+        return StreamingHttpResponse(
+            iter_json_lines(chunks, self.json_encoder), **response_kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.stream and self.get_media_type() == JSON_MEDIA_TYPE:
+            response = self.render_to_streaming_response(context,
+                                                         **response_kwargs)
+            patch_vary_headers(response, ('Accept',))
+            return response
+        return super(JsonListView, self).render_to_response(
+            context, **response_kwargs)
+
+    def render_to_streaming_response(self, context, **response_kwargs):
+        response_kwargs.setdefault('content_type', 'application/json')
+        return StreamingHttpResponse(self.iter_json(context),
+                                     **response_kwargs)
+
+    def iter_json(self, context):
+        # the envelope is serialized without the objects list
+        data = super(JsonListView, self).serialize_context(context)
+        key = self.context_object_name or 'object_list'
+        dumps = get_encoder(self.json_encoder)
+        if data:
+            yield dumps(data)[:-1] + b', ' + dumps(key) + b': ['
+        else:
+            yield b'{' + dumps(key) + b': ['
+        separator = b''
+        for chunk in self.iter_serialize_object_list(context['object_list'],
+                                                     context):
+            if chunk:
+                yield separator + dumps(chunk)[1:-1]
+                separator = b', '
+        yield b']}'
+
+    def iter_serialize_object_list(self, object_list, context):
+        """
+        Iterate over chunks (lists) of serialized objects
+        """
+        serializer = self.get_serializer()
+        if serializer is None:
+            for chunk in iter_serialize(object_list,
+                                        chunk_size=self.stream_chunk_size,
+                                        **self.get_serialize_options()):
+                yield chunk
+            return
+        if hasattr(object_list, 'iterator'):
+            object_list = object_list.iterator()
+        chunk = []
+        for obj in object_list:
+            chunk.append(obj)
+            if len(chunk) >= self.stream_chunk_size:
+                yield serialize(chunk, serializer, many=True, context=context)
+                chunk = []
+        if chunk:
+            yield serialize(chunk, serializer, many=True, context=context)
+
     def serialize_object_list(self, object_list, context):
         return serialize(object_list, self.get_serializer(), many=True,
-                         context=context)
+                         context=context, **self.get_serialize_options())
 
     def serialize_context(self, context):
         data = super(JsonListView, self).serialize_context(context)
@@ -72,17 +349,77 @@ class JsonListView(SerializePaginationMixin, JsonMixin, BaseListView):
         return data
 
 
-class JsonDetailView(JsonMixin, BaseDetailView):
+class JsonDetailView(SerializeFieldsMixin, JsonMixin, BaseDetailView):
+    """
+    Conditional GET is supported. When `version_field` (like `updated_at`
+    or a version column) is set, the version of the object is read by the
+    `values_list()` query and 304 response is returned before the object
+    is loaded and serialized. Otherwise ETag is the hash of the response
+    content. Override `get_version` to get the version another way.
+    """
+    version_field = None
 
-    def get_serializer(self):
-        return None
+    def get(self, request, *args, **kwargs):
+        version = self.get_version()
+        last_modified = None
+        if version is not None:
+            etag = self.get_version_etag(version)
+            if isinstance(version, datetime.datetime):
+                last_modified = self.get_timestamp(version)
+            if is_not_modified(request, etag, last_modified):
+                return self.get_not_modified_response(etag, last_modified)
+
+        response = super(JsonDetailView, self).get(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        if version is None:
+            etag = hashlib.sha1(response.content).hexdigest()
+            if is_not_modified(request, etag):
+                return self.get_not_modified_response(etag)
+
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_version(self):
+        """
+        Return version of the object or None if there is no version probe
+        """
+        if self.version_field is None:
+            return None
+        return self.get_object(self.get_queryset().values_list(
+            self.version_field, flat=True))
+
+    def get_version_etag(self, version):
+        view = self.__class__
+        return hashlib.sha1(force_bytes(repr([
+            '%s.%s' % (view.__module__, view.__name__),
+            sorted(self.kwargs.items()),
+            sorted(self.request.GET.lists()),
+            self.get_media_type(),
+            version,
+        ]))).hexdigest()
+
+    def get_timestamp(self, value):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_default_timezone())
+        return calendar.timegm(value.utctimetuple())
+
+    def get_not_modified_response(self, etag, last_modified=None):
+        response = HttpResponseNotModified()
+        patch_vary_headers(response, ('Accept',))
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
 
     def serialize_object(self, obj, context):
         return serialize(obj, self.get_serializer(), many=False,
-                         context=context)
+                         context=context, **self.get_serialize_options())
 
     def serialize_context(self, context):
         data = super(JsonDetailView, self).serialize_context(context)
-        obj = self.serialize_object(context['object_list'], context)
+        obj = self.serialize_object(context['object'], context)
         data[self.context_object_name or 'object'] = obj
         return data
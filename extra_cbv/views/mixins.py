@@ -3,18 +3,31 @@ Created on 12.11.2011
 
 @author: alekam
 '''
+import hashlib
+
 from django.contrib import messages
 from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import InvalidPage
 from django.core.urlresolvers import reverse
 from django.core.validators import EMPTY_VALUES
-from django.db.models.query_utils import Q
-from django.http import HttpResponseRedirect, QueryDict
+from django.http import Http404, HttpResponseRedirect, JsonResponse, \
+    QueryDict
 from django.http.response import HttpResponseBase
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
 from django.utils.http import is_safe_url
 from django.views.generic.detail import SingleObjectMixin
 
+from .. import jobs
+from ..actions import BulkAction, clean_pks, start_action_job
+from ..cache import get_queryset_key, track_models
+from ..identity import load_object
+from ..pagination import CursorPaginator
+from ..search.backends import get_search_backend
+
 
-__all__ = ['SuperSingleObjectMixin', 'ShowSuccessMessageMixin']
+__all__ = ['SuperSingleObjectMixin', 'ShowSuccessMessageMixin',
+           'CursorPaginationMixin', 'QuerysetPipelineMixin']
 
 
 class PreProcessMixin(object):
@@ -45,12 +58,38 @@ class PreProcessMixin(object):
 class SuperSingleObjectMixin(PreProcessMixin, SingleObjectMixin):
     """
     This mixin is the same as SingleObjectMixin, but it set up
-    `object` property before start processing request in GET or POST methods
+    `object` property before start processing request in GET or POST methods.
+    The object is loaded once per request, with `object_cache_timeout` it
+    is cached across requests until the model is changed.
     """
+    object_cache_timeout = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(SuperSingleObjectMixin, cls).as_view(**initkwargs)
+        if initkwargs.get('object_cache_timeout', cls.object_cache_timeout):
+            model = initkwargs.get('model', cls.model)
+            queryset = initkwargs.get('queryset', cls.queryset)
+            if model is None and queryset is not None:
+                model = queryset.model
+            if model is not None:
+                track_models([model])
+        return view
+
     def pre_process(self):
         self.object = self.get_object()
         return super(SuperSingleObjectMixin, self).pre_process()
 
+    def get_object(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+        key = get_queryset_key(queryset, self.slug_field,
+                               sorted(self.kwargs.items()))
+        return load_object(
+            self.request, key,
+            lambda: super(SuperSingleObjectMixin, self).get_object(queryset),
+            queryset.model, self.object_cache_timeout)
+
 
 class ShowSuccessMessageMixin(object):
     success_message = None
@@ -103,20 +142,77 @@ class NextRedirectMixin(object):
 
 
 class MassActionMixin(object):
+    """
+    Run the action from `actions` on the objects selected by `id` POST
+    parameters. `BulkAction` actions process objects by chunks, more than
+    `background_threshold` objects are processed by the background job and
+    202 response with the job status is returned.
+    """
     actions = {}
+    background_threshold = None
+    job_store = None
+    job_backend = None
+    job_url_name = None
 
     def post(self, request, *args, **kwargs):
         action = self.request.POST.get('action', False)
         if action:
             ids = self.request.POST.getlist('id')
-            qs = self.get_queryset().filter(id__in=ids)
-            action = self.actions.get(action, False)
+            name, action = action, self.actions.get(action, False)
             if action:
-                action(self, qs)
+                response = self.run_action(name, action, ids)
+                if response is not None:
+                    return response
             if not request.is_ajax():
                 return HttpResponseRedirect(reverse('report_list'))
         return self.get(request, *args, **kwargs)
 
+    def run_action(self, name, action, ids):
+        if not isinstance(action, BulkAction):
+            qs = self.get_queryset().filter(id__in=ids)
+            action(self, qs)
+            return None
+        queryset = self.get_queryset()
+        pks = clean_pks(queryset.model, ids)
+        if self.background_threshold is not None and \
+                len(pks) > self.background_threshold:
+            return self.start_action_job(name, action, queryset, pks)
+        action.run(queryset, pks)
+        return None
+
+    def get_job_store(self):
+        return self.job_store or jobs.get_default_job_store()
+
+    def get_job_backend(self):
+        return self.job_backend or jobs.get_default_job_backend()
+
+    def get_action_job_key(self, name, pks):
+        return repr((
+            self.__class__.__module__,
+            self.__class__.__name__,
+            name,
+            hashlib.sha1(force_bytes(repr(pks))).hexdigest(),
+            jobs.get_job_owner(self.request),
+        ))
+
+    def start_action_job(self, name, action, queryset, pks):
+        job_id, job = start_action_job(
+            self.get_job_store(), self.get_job_backend(),
+            self.get_action_job_key(name, pks), action, queryset, pks,
+            action_name=name, owner=jobs.get_job_owner(self.request))
+        data = {
+            'job': job_id,
+            'status': job['status'] if job else jobs.STATUS_PENDING,
+            'url': None,
+        }
+        if self.job_url_name is not None:
+            data['url'] = reverse(self.job_url_name,
+                                  kwargs={'job_id': job_id})
+        response = JsonResponse(data, status=202)
+        if data['url'] is not None:
+            response['Location'] = data['url']
+        return response
+
 
 class FilteredListMixin(object):
     filter_class = None
@@ -138,36 +234,115 @@ class FilteredListMixin(object):
         }
 
     def get_filter_object(self, qs=None):
-        return self.get_filter_class()(**self.get_filter_kwargs(qs))
+        return self.filter_queryset(qs)[0]
+
+    def filter_queryset(self, qs=None):
+        """
+        Return (filter object, filtered queryset). The filter is created
+        once per request for the queryset, the filtered queryset gives the
+        same filter too.
+        """
+        if qs is None:
+            qs = self.get_queryset()
+        filters = self.__dict__.setdefault('_filters', [])
+        for source, f, filtered in filters:
+            if qs is source or qs is filtered:
+                return f, filtered
+        f = self.get_filter_class()(**self.get_filter_kwargs(qs))
+        filters.append((qs, f, f.qs))
+        return f, filters[-1][2]
 
     def get_context_data(self, **kwargs):
         qs = kwargs.get('object_list')
         if qs is None:
             qs = self.get_queryset()
-        f = self.get_filter_object(qs)
-        kwargs['filter'] = f
-        kwargs['object_list'] = f.qs
+        kwargs['filter'], kwargs['object_list'] = self.filter_queryset(qs)
         return kwargs
 
 
+class QuerysetPipelineMixin(object):
+    """
+    Build the queryset of the list view once per request. The base queryset
+    with ordering, search of `SearchMixin` and filter of
+    `FilteredListMixin` are applied by the first `get_queryset()` call,
+    next calls return the same queryset object, so search and filters are
+    not built again and rows of the evaluated queryset are reused.
+
+    Queries of pagination are not saved: the paginator counts the rows and
+    loads the page by separate queries, `allow_empty = False` adds the
+    `exists()` query.
+
+    It must be placed before other queryset mixins of the view.
+    """
+
+    def get_queryset(self, *args, **kwargs):
+        if args or kwargs:
+            return super(QuerysetPipelineMixin, self).get_queryset(*args,
+                                                                   **kwargs)
+        if '_queryset' not in self.__dict__:
+            self._queryset = self.build_queryset()
+        return self._queryset
+
+    def build_queryset(self):
+        queryset = super(QuerysetPipelineMixin, self).get_queryset()
+        if isinstance(self, FilteredListMixin):
+            queryset = self.filter_queryset(queryset)[1]
+        return queryset
+
+
 class SearchMixin(object):
+    """
+    Search of objects by the query in `search_field` GET parameter. The
+    search is done by `search_backend` (instance, class or dotted path of
+    the backend from `extra_cbv.search.backends`), OR'ed `icontains`
+    lookups of `search_fields` by default.
+    """
     search_field = 'search'
     search_fields = []
+    search_backend = None
 
-    def get_queryset(self, qs):
+    def get_search_backend(self):
+        return get_search_backend(self.search_backend)
+
+    def get_queryset(self, qs=None):
+        if qs is None:
+            qs = super(SearchMixin, self).get_queryset()
         query = self.request.GET.get(self.search_field)
         if query not in EMPTY_VALUES:
             query = query.strip()
             if query not in EMPTY_VALUES and len(self.search_fields) > 0:
-                lookup = None
-                for field in self.search_fields:
-                    if lookup is None:
-                        lookup = Q(**{'%s__icontains' % field: query})
-                    else:
-                        lookup = lookup | Q(**{'%s__icontains' % field: query})
-                qs = qs.filter(lookup)
+                qs = self.get_search_backend().search(qs, query,
+                                                      self.search_fields)
         return qs
 
     def get_context_data(self, **kwargs):
         kwargs[self.search_field] = self.request.GET.get(self.search_field)
         return kwargs
+
+
+class CursorPaginationMixin(object):
+    """
+    Keyset pagination of list views by `CursorPaginator`. The page is
+    selected by the cursor token in `cursor_kwarg` GET parameter, pages
+    have `next_cursor` and `previous_cursor` tokens instead of numbers.
+    """
+    cursor_ordering = None
+    cursor_kwarg = 'cursor'
+
+    def get_cursor_ordering(self, queryset):
+        if self.cursor_ordering is not None:
+            return self.cursor_ordering
+        ordering = self.get_ordering()
+        if isinstance(ordering, six.string_types):
+            return [ordering]
+        return ordering or queryset.query.order_by or \
+            queryset.model._meta.ordering or ['pk']
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size,
+                                    self.get_cursor_ordering(queryset))
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage as e:
+            raise Http404(force_text(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -1,23 +1,148 @@
 from .mixins import SuperSingleObjectMixin, PreProcessMixin
+from .. import jobs
+from ..cache import get_model_versions, get_queryset_key, track_models
+from ..compress import compress_response
+from ..utils import is_not_modified
 from django.core.exceptions import ImproperlyConfigured
-from django.http import HttpResponse
+from django.core.urlresolvers import reverse
+from django.http import Http404, HttpResponse, StreamingHttpResponse, \
+    FileResponse, JsonResponse, HttpResponseNotModified
+from django.utils.encoding import force_bytes
+from django.utils.http import http_date, quote_etag
 from django.views.generic.base import View, RedirectView
 from django.views.generic.list import ListView
-import StringIO
+import hashlib
+import inspect
+import re
+import tempfile
 
 
-__all__ = ['DownloadReportView', 'PaginatedListView']
+__all__ = ['DownloadReportView', 'ExportView', 'ExportJobView',
+           'PaginatedListView']
 
 
-class DownloadReportView(View):
+# size of the report kept in memory before it is written to the disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# size of chunks of files sent to the client
+FILE_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def parse_range_header(header, size):
+    """
+    Return (first, last) positions of the bytes range requested in `Range`
+    header for the file of `size` bytes, `last` position is included.
+    Return None if header is not valid or requests several ranges, such
+    headers are ignored and the whole file is sent.
+    """
+    match = RANGE_RE.match(header)
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # suffix range: last N bytes of the file
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    if not last:
+        return first, size - 1
+    last = int(last)
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def iter_file(f, first=0, length=None, chunk_size=FILE_CHUNK_SIZE):
+    """
+    Iterate over `length` bytes of file `f` from `first` position by chunks
+    and close the file at the end.
+    """
+    try:
+        f.seek(first)
+        while length is None or length > 0:
+            if length is None:
+                chunk = f.read(chunk_size)
+            else:
+                chunk = f.read(min(chunk_size, length))
+                length -= len(chunk)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+class FileResponseMixin(object):
+    """
+    Send files with support of single bytes range requests
+    """
+    chunk_size = FILE_CHUNK_SIZE
+
+    def get_file_response(self, output, content_type):
+        output.seek(0, 2)
+        size = output.tell()
+        output.seek(0)
+
+        byte_range = None
+        range_header = self.request.META.get('HTTP_RANGE')
+        # files have no validators, so conditional range requests always
+        # get the whole file
+        if range_header and 'HTTP_IF_RANGE' not in self.request.META:
+            byte_range = parse_range_header(range_header, size)
+
+        if byte_range is None:
+            response = FileResponse(output, content_type=content_type)
+            response.block_size = self.chunk_size
+            response['Content-Length'] = size
+        else:
+            first, last = byte_range
+            if first >= size:
+                output.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+            length = last - first + 1
+            response = StreamingHttpResponse(
+                iter_file(output, first, length, self.chunk_size),
+                content_type=content_type, status=206)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (first, last,
+                                                              size)
+            response['Content-Length'] = length
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+
+class DownloadReportView(FileResponseMixin, View):
+    """
+    Send the report generated by the builder.
+
+    Builder generates the report by `generate(output)` method, which writes
+    the report into the `output` file. The output is kept in memory up to
+    `spool_max_size` bytes and spilled to the temporary file above it.
+    Such reports support HTTP `Range` requests, so downloads can be resumed.
+
+    Builders which have `streamable = True` attribute or which `generate`
+    method is a generator are called without output, chunks yielded by
+    `generate()` are sent to the client as soon as they are generated.
+
+    With `compress = True` reports are compressed on the fly by gzip (or
+    zstd when `zstandard` is installed) accepted by the client.
+    """
     builder_class = None
+    spool_max_size = SPOOL_MAX_SIZE
+    compress = False
 
     def get_builder(self):
         builder_class = self.get_builder_class()
         if builder_class is None:
             raise ImproperlyConfigured(u'You must define `builder_class` '
                                        'in your view')
-        return builder_class(**self.get_builder_kwargs())
+        # arguments are kept for the keys of cached reports
+        self.builder_kwargs = self.get_builder_kwargs()
+        return builder_class(**self.builder_kwargs)
 
     def get_builder_class(self):
         return self.builder_class
@@ -27,15 +152,37 @@ class DownloadReportView(View):
 
     def get(self, *args, **kwargs):
         self.report = self.get_builder()
-        output = StringIO.StringIO()
-        self.report.generate(output)
-
-        response = HttpResponse(content=output.getvalue(),
-                                mimetype=self.get_mimetype())
+        if self.is_streamable():
+            response = StreamingHttpResponse(self.report.generate(),
+                                             content_type=self.get_mimetype())
+        else:
+            output = self.get_output()
+            self.report.generate(output)
+            response = self.get_file_response(output, self.get_mimetype())
         response['Content-Disposition'] = \
             'attachment;filename="%s"' % self.get_filename()
+        return self.compress_response(response)
+
+    def compress_response(self, response):
+        if self.compress:
+            return compress_response(self.request, response)
         return response
 
+    def write_report(self, output):
+        if self.is_streamable():
+            for chunk in self.report.generate():
+                output.write(chunk)
+        else:
+            self.report.generate(output)
+
+    def is_streamable(self):
+        if getattr(self.report, 'streamable', False):
+            return True
+        return inspect.isgeneratorfunction(self.report.generate)
+
+    def get_output(self):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+
     def get_filename(self):
         return '%s.%s' % ('report', self.get_file_ext())
 
@@ -47,19 +194,197 @@ class DownloadReportView(View):
 
 
 class ExportView(DownloadReportView):
+    """
+    Export queryset by the builder.
+
+    With `run_in_background = True` POST requests start the background job
+    which builds the export and return 202 response with id of the job.
+    The status and the result of the job are available to the user who
+    started it in `ExportJobView` named as `job_url_name`. Identical
+    requests of the same user share the active job instead of starting
+    new one.
+
+    Exports are cached in `export_cache` (`extra_cbv.cache.FileCache`)
+    when it is set. Entries are keyed by the compiled SQL of the queryset,
+    versions of `export_cache_models` data (the model of the queryset by
+    default), the other builder arguments and the file format, so changes
+    of the data create new entries. Cached exports are sent with `ETag`
+    and `Last-Modified` (time of the entry creation) headers, so repeated
+    downloads get 304 responses.
+    """
     queryset = None
+    run_in_background = False
+    job_store = None
+    job_backend = None
+    job_url_name = None
+    export_cache = None
+    export_cache_models = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(ExportView, cls).as_view(**initkwargs)
+        if initkwargs.get('export_cache', cls.export_cache) is not None:
+            models = initkwargs.get('export_cache_models',
+                                    cls.export_cache_models)
+            queryset = initkwargs.get('queryset', cls.queryset)
+            if models is None and queryset is not None:
+                models = [queryset.model]
+            track_models(models or [])
+        return view
 
     def get_queryset(self):
         return self.queryset
 
-    def get_builder_kwags(self):
+    def get(self, *args, **kwargs):
+        cache = self.get_export_cache()
+        if cache is None:
+            return super(ExportView, self).get(*args, **kwargs)
+
+        self.report = self.get_builder()
+        builder_kwargs = getattr(self, 'builder_kwargs', None)
+        if builder_kwargs is None:
+            builder_kwargs = self.get_builder_kwargs()
+        key = self.get_export_cache_key(builder_kwargs)
+        entry = cache.get(key)
+        if entry is None:
+            entry = cache.set(key, self.write_report)
+        output, modified = entry
+
+        etag = hashlib.sha1(force_bytes('%s:%s' % (key, modified))) \
+            .hexdigest()
+        if is_not_modified(self.request, etag, modified):
+            output.close()
+            response = HttpResponseNotModified()
+        else:
+            response = self.get_file_response(output, self.get_mimetype())
+            response['Content-Disposition'] = \
+                'attachment;filename="%s"' % self.get_filename()
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(modified)
+        return self.compress_response(response)
+
+    def get_export_cache(self):
+        return self.export_cache
+
+    def get_export_cache_models(self, queryset):
+        if self.export_cache_models is not None:
+            return self.export_cache_models
+        if queryset is None:
+            return []
+        return [queryset.model]
+
+    def get_export_cache_key(self, builder_kwargs):
+        builder_kwargs = builder_kwargs.copy()
+        queryset = builder_kwargs.pop('queryset', None)
+        builder_class = self.report.__class__
+        extra = (
+            builder_class.__module__,
+            builder_class.__name__,
+            sorted(builder_kwargs.items()),
+            self.get_file_ext(),
+            get_model_versions(self.get_export_cache_models(queryset)),
+        )
+        if queryset is None:
+            return repr(extra)
+        return get_queryset_key(queryset, *extra)
+
+    def get_builder_kwargs(self):
         return {
             'queryset': self.get_queryset()
         }
 
     def post(self, *args, **kwargs):
+        if self.run_in_background:
+            return self.start_job()
         return self.get(*args, **kwargs)
 
+    def get_job_store(self):
+        return self.job_store or jobs.get_default_job_store()
+
+    def get_job_backend(self):
+        return self.job_backend or jobs.get_default_job_backend()
+
+    def get_job_key(self):
+        """
+        Return key which is the same for identical requests
+        """
+        return repr((
+            self.__class__.__module__,
+            self.__class__.__name__,
+            sorted(self.kwargs.items()),
+            jobs.get_request_parameters(self.request),
+            jobs.get_job_owner(self.request),
+        ))
+
+    def get_job_url(self, job_id):
+        if self.job_url_name is None:
+            return None
+        return reverse(self.job_url_name, kwargs={'job_id': job_id})
+
+    def start_job(self):
+        self.report = self.get_builder()
+        job_id, job = jobs.start_job(
+            self.get_job_store(), self.get_job_backend(),
+            self.get_job_key(), self.write_report,
+            filename=self.get_filename(), content_type=self.get_mimetype(),
+            owner=jobs.get_job_owner(self.request))
+        url = self.get_job_url(job_id)
+        response = JsonResponse({
+            'job': job_id,
+            'status': job['status'] if job else jobs.STATUS_PENDING,
+            'url': url,
+        }, status=202)
+        if url is not None:
+            response['Location'] = url
+        return response
+
+
+class ExportJobView(FileResponseMixin, View):
+    """
+    Show status of the export job started by `ExportView` or send its
+    result when the job is done. Status of other jobs (mass actions) is
+    shown with their progress. Jobs are shown to their owners only.
+    """
+    job_store = None
+    job_id_url_kwarg = 'job_id'
+
+    def get_job_store(self):
+        return self.job_store or jobs.get_default_job_store()
+
+    def get(self, request, *args, **kwargs):
+        store = self.get_job_store()
+        job_id = kwargs.get(self.job_id_url_kwarg)
+        job = store.get(job_id)
+        if job is None or not self.is_job_owner(job):
+            raise Http404(u'Job not found')
+
+        if job['status'] == jobs.STATUS_DONE and 'filename' in job:
+            response = self.get_file_response(store.open_result(job_id),
+                                              job['content_type'])
+            response['Content-Disposition'] = \
+                'attachment;filename="%s"' % job['filename']
+            return response
+
+        data = {
+            'job': job_id,
+            'status': job['status'],
+        }
+        # progress of the jobs which report it
+        for name in ('done', 'total', 'processed'):
+            if name in job:
+                data[name] = job[name]
+        if job['status'] == jobs.STATUS_DONE:
+            return JsonResponse(data)
+        if job['status'] == jobs.STATUS_FAILED:
+            data['error'] = job.get('error')
+            return JsonResponse(data, status=500)
+        return JsonResponse(data, status=202)
+
+    def is_job_owner(self, job):
+        owner = job.get('owner')
+        return owner is None or \
+            owner == jobs.get_job_owner(self.request, create_session=False)
+
 
 class PaginatedListView(ListView):
 
@@ -71,6 +396,8 @@ class PaginatedListView(ListView):
         return ctx
 
     def get_pages(self, p, page):
+        if p.num_pages is None:
+            return self.get_countless_pages(p, page)
         pags = []
         pg = page.number
         if 1 < pg - 2:
@@ -87,6 +414,23 @@ class PaginatedListView(ListView):
             pags.append((p.num_pages, p.num_pages,))
         return pags
 
+    def get_countless_pages(self, p, page):
+        """
+        Pages links of the paginator which does not know the count of pages,
+        there are links to the first, the previous and the next pages only
+        """
+        pags = []
+        pg = page.number
+        if 1 < pg - 2:
+            pags.append((1, 1,))
+            pags.append(('...', None,))
+        for n in range(max(pg - 2, 1), pg + 1):
+            pags.append((n, n,))
+        if page.has_next():
+            pags.append((pg + 1, pg + 1,))
+            pags.append(('...', None,))
+        return pags
+
 
 class ProcessView(PreProcessMixin, RedirectView):
 
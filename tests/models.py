@@ -0,0 +1,40 @@
+# coding: utf-8
+from django.db import models
+
+
+class Author(models.Model):
+    KIND_CHOICES = (
+        (1, u'Writer'),
+        (2, u'Editor'),
+    )
+    name = models.CharField(max_length=100)
+    kind = models.IntegerField(choices=KIND_CHOICES, default=1)
+    birth_date = models.DateField(null=True, blank=True)
+
+    def __unicode__(self):
+        return self.name
+
+
+class AuthorProxy(Author):
+
+    class Meta:
+        proxy = True
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+    def __unicode__(self):
+        return self.name
+
+
+class Book(models.Model):
+    author = models.ForeignKey(Author, related_name='books',
+                               on_delete=models.CASCADE)
+    title = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    tags = models.ManyToManyField(Tag, related_name='books', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return self.title
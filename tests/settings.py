@@ -1,8 +1,13 @@
+import os
+import tempfile
+
+
 SECRET_KEY = 'test-key'
 
 INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.auth',
+    'extra_cbv.search',
     'tests',
 ]
 
@@ -10,6 +15,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
+        # file database is shared with worker threads and processes
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(),
+                                 'extra_cbv_tests.sqlite3'),
+        },
     }
 }
 
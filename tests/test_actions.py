@@ -0,0 +1,138 @@
+# coding: utf-8
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase
+
+from extra_cbv import jobs
+from extra_cbv.actions import BulkUpdateAction, DeleteAction, UpdateAction, \
+    clean_pks
+from extra_cbv.views.json import CacheResponseMixin, JsonListView
+from extra_cbv.views.mixins import MassActionMixin
+
+from .models import Author, Book
+from .test_jobs import PendingJobBackend
+
+
+class RenameAction(BulkUpdateAction):
+    fields = ['name']
+
+    def update_object(self, obj):
+        obj.name = obj.name.upper()
+
+
+class AuthorListView(MassActionMixin, CacheResponseMixin, JsonListView):
+    model = Author
+    ordering = 'pk'
+    actions = {
+        'editors': UpdateAction(chunk_size=2, kind=2),
+        'rename': RenameAction(chunk_size=2),
+        'delete': DeleteAction(),
+    }
+
+
+class BulkActionTestCase(TestCase):
+
+    def setUp(self):
+        self.authors = [Author.objects.create(name=u'author %d' % i)
+                        for i in range(5)]
+        self.pks = [author.pk for author in self.authors]
+
+    def test_clean_pks(self):
+        self.assertEqual(clean_pks(Author, ['2', u'x', 1, '2', None, '']),
+                         [2, 1])
+
+    def test_update_by_chunks(self):
+        calls = []
+        action = UpdateAction(chunk_size=2, kind=2)
+        processed = action.run(Author.objects.all(), self.pks,
+                               lambda done, total: calls.append(
+                                   (done, total)))
+        self.assertEqual(processed, 5)
+        self.assertEqual(calls, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual(set(Author.objects.values_list('kind', flat=True)),
+                         set([2]))
+
+    def test_queryset_is_respected(self):
+        queryset = Author.objects.filter(pk__in=self.pks[:2])
+        self.assertEqual(UpdateAction(kind=2).run(queryset, self.pks), 2)
+        self.assertEqual(Author.objects.filter(kind=2).count(), 2)
+
+    def test_bulk_update(self):
+        self.assertEqual(RenameAction(chunk_size=2).run(
+            Author.objects.all(), self.pks[1:]), 4)
+        self.assertEqual(list(Author.objects.order_by('pk').values_list(
+            'name', flat=True)),
+            [u'author 0'] + [u'AUTHOR %d' % i for i in range(1, 5)])
+
+    def test_bulk_update_requires_fields(self):
+        action = RenameAction()
+        action.fields = []
+        with self.assertRaises(ImproperlyConfigured):
+            action.run(Author.objects.all(), self.pks)
+        self.assertEqual(list(Author.objects.order_by('pk').values_list(
+            'name', flat=True)), [u'author %d' % i for i in range(5)])
+
+    def test_delete(self):
+        author = self.authors[0]
+        Book.objects.create(author=author, title=u'Book')
+        self.assertEqual(DeleteAction().run(Author.objects.all(),
+                                            self.pks[:2]), 2)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Book.objects.count(), 0)
+
+
+class MassActionTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.authors = [Author.objects.create(name=u'author %d' % i)
+                        for i in range(5)]
+        self.factory = RequestFactory()
+
+    def get_kinds(self):
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        data = json.loads(AuthorListView.as_view()(request).content)
+        return [item['kind'] for item in data['object_list']]
+
+    def post(self, action, ids, **initkwargs):
+        request = self.factory.post('/', {'action': action, 'id': ids},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        request.user = AnonymousUser()
+        return AuthorListView.as_view(**initkwargs)(request)
+
+    def test_cached_list_is_changed(self):
+        self.assertEqual(self.get_kinds(), [1] * 5)
+        self.post('editors', [self.authors[0].pk, self.authors[4].pk])
+        self.assertEqual(self.get_kinds(), [2, 1, 1, 1, 2])
+        self.post('rename', [author.pk for author in self.authors])
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        data = json.loads(AuthorListView.as_view()(request).content)
+        self.assertEqual(data['object_list'][0]['name'], u'AUTHOR 0')
+
+    def test_background_job(self):
+        location = tempfile.mkdtemp()
+        try:
+            store = jobs.FileSystemJobStore(location)
+            backend = PendingJobBackend()
+            self.get_kinds()
+            response = self.post(
+                'editors', [author.pk for author in self.authors],
+                background_threshold=2, job_store=store, job_backend=backend)
+            self.assertEqual(response.status_code, 202)
+            job_id = json.loads(response.content)['job']
+            self.assertEqual(self.get_kinds(), [1] * 5)
+            backend.run_all()
+            job = store.get(job_id)
+            self.assertEqual(job['status'], jobs.STATUS_DONE)
+            self.assertEqual((job['done'], job['total'], job['processed']),
+                             (5, 5, 5))
+            self.assertEqual(self.get_kinds(), [2] * 5)
+        finally:
+            shutil.rmtree(location)
@@ -0,0 +1,90 @@
+# coding: utf-8
+import json
+
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.test import RequestFactory, TestCase, TransactionTestCase
+
+from extra_cbv.cache import get_model_versions, track_models
+from extra_cbv.views.json import CacheResponseMixin, JsonListView
+
+from .models import Author, AuthorProxy, Book, Tag
+
+
+class AuthorListView(CacheResponseMixin, JsonListView):
+    model = Author
+
+
+class ModelVersionsTestCase(TestCase):
+
+    def test_untracked_models_have_no_receivers(self):
+        self.assertFalse(post_save.has_listeners(Permission))
+        self.assertFalse(post_delete.has_listeners(Permission))
+
+    def test_save_and_delete(self):
+        track_models([Author])
+        version = get_model_versions([Author])
+        author = Author.objects.create(name=u'Tolstoy')
+        self.assertNotEqual(get_model_versions([Author]), version)
+        version = get_model_versions([Author])
+        author.delete()
+        self.assertNotEqual(get_model_versions([Author]), version)
+
+    def test_proxy_model(self):
+        track_models([Author])
+        version = get_model_versions([Author])
+        AuthorProxy.objects.create(name=u'Tolstoy')
+        self.assertNotEqual(get_model_versions([Author]), version)
+
+    def test_m2m_changes(self):
+        track_models([Tag])
+        book = Book.objects.create(
+            author=Author.objects.create(name=u'Tolstoy'), title=u'Book')
+        tag = Tag.objects.create(name=u'novel')
+        versions = get_model_versions([Book, Tag])
+        book.tags.add(tag)
+        new_versions = get_model_versions([Book, Tag])
+        self.assertNotEqual(new_versions[0], versions[0])
+        self.assertNotEqual(new_versions[1], versions[1])
+
+
+class VersionsOnCommitTestCase(TransactionTestCase):
+
+    def test_version_is_changed_after_commit(self):
+        track_models([Author])
+        with transaction.atomic():
+            Author.objects.create(name=u'Tolstoy')
+            # version seen by concurrent requests before the commit
+            version = get_model_versions([Author])
+        self.assertNotEqual(get_model_versions([Author]), version)
+
+
+class CacheResponseMixinTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+        self.view = AuthorListView.as_view()
+        Author.objects.create(name=u'Tolstoy')
+
+    def get_names(self, **params):
+        response = self.view(self.factory.get('/', params))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf8'))
+        return [obj['name'] for obj in data['object_list']]
+
+    def test_cached_response(self):
+        self.assertEqual(self.get_names(), [u'Tolstoy'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names(), [u'Tolstoy'])
+        with self.assertNumQueries(1):
+            self.get_names(page=1)
+
+    def test_changes_drop_cached_responses(self):
+        self.assertEqual(self.get_names(), [u'Tolstoy'])
+        Author.objects.create(name=u'Chekhov')
+        self.assertEqual(self.get_names(), [u'Tolstoy', u'Chekhov'])
+        Author.objects.filter(name=u'Chekhov').delete()
+        self.assertEqual(self.get_names(), [u'Tolstoy'])
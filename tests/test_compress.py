@@ -0,0 +1,92 @@
+# coding: utf-8
+import gzip
+import io
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.compress import compress_response, gzip_stream, \
+    negotiate_encoding
+from extra_cbv.views.excel import StreamingExcelResponse
+
+from .models import Author
+from .test_reports import ReportView
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class CompressTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_gzip_stream(self):
+        chunks = list(gzip_stream(iter([b'abc', b'', b'def'])))
+        self.assertEqual(gunzip(b''.join(chunks)), b'abcdef')
+        # every chunk is flushed
+        self.assertTrue(len(chunks) >= 3)
+
+    def test_negotiate_encoding(self):
+        def negotiate(header):
+            result = negotiate_encoding(
+                self.factory.get('/', HTTP_ACCEPT_ENCODING=header),
+                [('gzip', gzip_stream)])
+            return result and result[0]
+
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('*'), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0'))
+        self.assertIsNone(negotiate('*, gzip;q=0'))
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate(''))
+
+    def test_compress_response(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = HttpResponse(b'x' * 1000)
+        response['ETag'] = '"abc"'
+        response = compress_response(request, response,
+                                     [('gzip', gzip_stream)])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+        self.assertEqual(gunzip(response.content), b'x' * 1000)
+
+    def test_compress_streaming_response(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = StreamingHttpResponse(iter([b'a', b'b']))
+        response['Content-Length'] = '2'
+        response['Accept-Ranges'] = 'bytes'
+        response = compress_response(request, response,
+                                     [('gzip', gzip_stream)])
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertFalse(response.has_header('Accept-Ranges'))
+        self.assertEqual(gunzip(b''.join(response.streaming_content)), b'ab')
+
+    def test_not_accepted(self):
+        response = compress_response(self.factory.get('/'),
+                                     HttpResponse(b'data'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, b'data')
+
+    def test_compressed_csv_export(self):
+        Author.objects.create(name=u'Tolstoy')
+        response = StreamingExcelResponse(Author.objects.all(),
+                                          output_name='authors',
+                                          headers=['name'], compress=True)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment;filename="authors.csv.gz"')
+        self.assertEqual(gunzip(b''.join(response.streaming_content)),
+                         b'"name"\n"Tolstoy"\n')
+
+    def test_compressed_report(self):
+        response = ReportView.as_view(compress=True)(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gunzip(b''.join(response.streaming_content)),
+                         b'0123456789')
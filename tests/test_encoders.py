@@ -0,0 +1,92 @@
+# coding: utf-8
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.translation import ugettext_lazy
+
+from extra_cbv import encoders
+from extra_cbv.decorators import json_response
+from extra_cbv.encoders import EncodedJsonResponse, dumps, get_encoder, \
+    is_available, register_encoder
+
+
+DATA = {
+    'datetime': datetime.datetime(2017, 5, 1, 12, 30, 15),
+    'date': datetime.date(2017, 5, 1),
+    'time': datetime.time(12, 30),
+    'decimal': Decimal('1.50'),
+    'uuid': uuid.UUID('12345678123456781234567812345678'),
+    'lazy': ugettext_lazy(u'Lazy'),
+    'text': u'Текст',
+    'list': [1, 2.5, None, True],
+}
+
+EXPECTED = {
+    'datetime': u'2017-05-01T12:30:15',
+    'date': u'2017-05-01',
+    'time': u'12:30:00',
+    'decimal': u'1.50',
+    'uuid': u'12345678-1234-5678-1234-567812345678',
+    'lazy': u'Lazy',
+    'text': u'Текст',
+    'list': [1, 2.5, None, True],
+}
+
+
+class EncodersTestCase(TestCase):
+
+    def test_encoders_output(self):
+        for name in sorted(encoders.ENCODERS):
+            if not is_available(name):
+                continue
+            content = dumps(DATA, name)
+            self.assertIsInstance(content, bytes)
+            self.assertEqual(json.loads(content.decode('utf-8')), EXPECTED,
+                             name)
+
+    @override_settings(EXTRA_CBV_JSON_ENCODER='simplejson')
+    def test_default_setting(self):
+        self.assertIs(get_encoder(), encoders.ENCODERS['simplejson'])
+
+    def test_default_is_available(self):
+        self.assertTrue(is_available(encoders.get_default_encoder_name()))
+
+    def test_unknown_encoder(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_encoder('unknown')
+
+    def test_missing_module(self):
+        register_encoder('missing', dumps, module='extra_cbv_missing_module')
+        try:
+            self.assertFalse(is_available('missing'))
+        finally:
+            del encoders.ENCODERS['missing']
+            del encoders.ENCODER_MODULES['missing']
+
+    def test_response(self):
+        response = EncodedJsonResponse({'value': Decimal('1.5')},
+                                       encoder='json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'value': u'1.5'})
+        with self.assertRaises(TypeError):
+            EncodedJsonResponse([1])
+        response = EncodedJsonResponse([1], safe=False)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), [1])
+
+    def test_json_response_decorator(self):
+        view = json_response(lambda request: {'date': DATA['date']})
+        response = view(RequestFactory().get('/'))
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         {'date': u'2017-05-01'})
+        other = HttpResponse()
+        self.assertIs(json_response(lambda request: other)(None), other)
+
+    def test_default_encoder(self):
+        self.assertEqual(encoders.get_default_encoder_name(), 'json')
+        self.assertIs(get_encoder(), encoders.ENCODERS['json'])
@@ -0,0 +1,306 @@
+# coding: utf-8
+import datetime
+import io
+from decimal import Decimal
+from multiprocessing.pool import ThreadPool
+
+import mock
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from extra_cbv.views.excel import XLSX_MIMETYPE, Column, ColumnSchema, \
+    ExcelResponse, StreamingExcelResponse, WorkbookResponse, get_pk_ranges, \
+    get_sheet_title, get_table, is_ordered_by_pk, load_sheets
+
+from .models import Author, Book
+
+
+class StreamingExcelResponseTestCase(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Leo "Lev" Tolstoy')
+        Book.objects.create(author=author, title=u'War and Peace',
+                            price=Decimal('10.50'))
+        Book.objects.create(author=author, title=u'Анна Каренина',
+                            price=Decimal('7'))
+
+    def test_csv_of_queryset(self):
+        response = StreamingExcelResponse(
+            Book.objects.order_by('pk'), output_name='books',
+            headers=['title', 'price'])
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment;filename="books.csv"')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode('utf8'),
+            u'"title","price"\n'
+            u'"War and Peace","10.50"\n'
+            u'"Анна Каренина","7.00"\n')
+
+    def test_values_are_escaped(self):
+        response = StreamingExcelResponse(Author.objects.all(),
+                                          headers=['name'])
+        self.assertEqual(b''.join(response.streaming_content),
+                         b'"name"\n"Leo ""Lev"" Tolstoy"\n')
+
+    def test_queryset_is_not_cached(self):
+        queryset = Book.objects.order_by('pk')
+        response = StreamingExcelResponse(queryset, headers=['title'],
+                                          chunk_size=1)
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertIsNone(queryset._result_cache)
+
+    def test_rows_of_lists(self):
+        response = StreamingExcelResponse([[1, u'a'], [2, u'b']])
+        self.assertEqual(b''.join(response.streaming_content),
+                         b'"1","a"\n"2","b"\n')
+
+    def test_empty_data(self):
+        response = StreamingExcelResponse(Book.objects.none())
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+
+def read_xlsx(content):
+    import openpyxl
+
+    book = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+    return [(sheet.title, [[cell.value for cell in row]
+                           for row in sheet.iter_rows()])
+            for sheet in book.worksheets]
+
+
+class XlsxExportTestCase(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        for i in range(5):
+            Book.objects.create(author=author, title=u'Book %d' % i,
+                                price=i)
+
+    def test_xlsx_response(self):
+        response = ExcelResponse(Book.objects.order_by('pk'),
+                                 output_name='books',
+                                 headers=['title', 'price'])
+        self.assertEqual(response['Content-Type'], XLSX_MIMETYPE)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment;filename="books.xlsx"')
+        [(title, rows)] = read_xlsx(response.content)
+        self.assertEqual(title, u'Sheet 1')
+        self.assertEqual(rows[0], [u'title', u'price'])
+        self.assertEqual(rows[1:], [[u'Book %d' % i, i] for i in range(5)])
+
+    def test_rows_are_split_across_sheets(self):
+        with mock.patch('extra_cbv.views.excel.XLSX_MAX_ROWS', 3):
+            response = StreamingExcelResponse(
+                Book.objects.order_by('pk'), headers=['title'],
+                file_format='xlsx', sheet_title=u'Books')
+            content = b''.join(response.streaming_content)
+        sheets = read_xlsx(content)
+        self.assertEqual([title for title, rows in sheets],
+                         [u'Books', u'Books (2)', u'Books (3)'])
+        for title, rows in sheets:
+            self.assertEqual(rows[0], [u'title'])
+        self.assertEqual(sum([rows[1:] for title, rows in sheets], []),
+                         [[u'Book %d' % i] for i in range(5)])
+
+    def test_dates_have_formats(self):
+        now = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        response = ExcelResponse([[now, now.date()]])
+        [(title, rows)] = read_xlsx(response.content)
+        self.assertEqual(rows, [[now, datetime.datetime(2020, 1, 2)]])
+
+    def test_force_xls(self):
+        response = ExcelResponse(Book.objects.all(), force_xls=True)
+        self.assertEqual(response['Content-Type'],
+                         'application/vnd.ms-excel')
+
+    def test_sheet_title(self):
+        self.assertEqual(get_sheet_title(u'x' * 40, 1), u'x' * 31)
+        self.assertEqual(get_sheet_title(u'x' * 40, 2), u'x' * 27 + u' (2)')
+
+
+class ColumnSchemaTestCase(TestCase):
+
+    def test_columns_of_model_fields(self):
+        schema = ColumnSchema.for_model(
+            Book, ['title', 'price', 'author', 'author__birth_date',
+                   'unknown'])
+        self.assertEqual([column.style for column in schema.columns],
+                         ['default', 'default', 'default', 'date', None])
+        self.assertEqual([column.quoted for column in schema.columns],
+                         [True, False, False, False, True])
+
+    def test_csv_encoders(self):
+        schema = ColumnSchema([
+            Column('name'),
+            Column('count', quoted=False),
+            Column('upper', converter=lambda value: value.upper()),
+        ], ['name', 'count', 'upper'])
+        self.assertEqual(
+            b''.join(schema.iter_csv([[u'a"b', 10, u'x']])),
+            b'"name","count","upper"\n"a""b","10","X"\n')
+
+    def test_cells_styles(self):
+        now = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        schema = ColumnSchema([Column('date', style='date'), Column()])
+        styles = {'date': 'D', 'datetime': 'DT', 'time': 'T',
+                  'default': None}
+        self.assertEqual(list(schema.iter_cells([[now, now]], styles)),
+                         [[(now, 'D'), (now, 'DT')]])
+
+
+class DisplayChoicesTestCase(TestCase):
+
+    def setUp(self):
+        Author.objects.create(name=u'Tolstoy', kind=1)
+        Author.objects.create(name=u'Perkins', kind=2)
+
+    def test_csv(self):
+        queryset = Author.objects.order_by('pk')
+        response = ExcelResponse(queryset, headers=['name', 'kind'],
+                                 force_csv=True, display_choices=True)
+        self.assertEqual(response.content,
+                         b'"name","kind"\n"Tolstoy","Writer"\n'
+                         b'"Perkins","Editor"\n')
+        response = ExcelResponse(queryset, headers=['name', 'kind'],
+                                 force_csv=True)
+        self.assertEqual(response.content,
+                         b'"name","kind"\n"Tolstoy","1"\n"Perkins","2"\n')
+
+    def test_streaming_csv(self):
+        response = StreamingExcelResponse(
+            Author.objects.order_by('pk'), headers=['kind'],
+            display_choices=True)
+        self.assertEqual(b''.join(response.streaming_content),
+                         b'"kind"\n"Writer"\n"Editor"\n')
+
+    def test_xlsx(self):
+        response = StreamingExcelResponse(
+            Author.objects.order_by('pk'), headers=['kind'],
+            file_format='xlsx', display_choices=True)
+        [(title, rows)] = read_xlsx(b''.join(response.streaming_content))
+        self.assertEqual(rows, [[u'kind'], [u'Writer'], [u'Editor']])
+
+
+class ColumnProjectionTestCase(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        Book.objects.create(author=author, title=u'War and Peace', price=10)
+
+    def get_sql(self, data, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            schema, rows = get_table(data, **kwargs)
+            rows = list(rows)
+        self.assertEqual(len(queries), 1)
+        return queries[0]['sql'], schema, rows
+
+    def test_only_headers_are_selected(self):
+        sql, schema, rows = self.get_sql(Book.objects.all(),
+                                         headers=['title', 'author__name'])
+        self.assertNotIn('"price"', sql)
+        self.assertEqual(rows, [(u'War and Peace', u'Tolstoy')])
+        self.assertEqual(schema.headers, ['title', 'author__name'])
+
+    def test_exclude(self):
+        sql, schema, rows = self.get_sql(Book.objects.all(),
+                                         exclude=['price', 'author',
+                                                  'updated_at'])
+        self.assertNotIn('"price"', sql)
+        self.assertNotIn('"author_id"', sql)
+        self.assertEqual(schema.headers, ['id', 'title'])
+        self.assertEqual(rows, [(Book.objects.get().pk, u'War and Peace')])
+
+    def test_all_fields(self):
+        sql, schema, rows = self.get_sql(Author.objects.all())
+        self.assertEqual(sorted(schema.headers),
+                         ['birth_date', 'id', 'kind', 'name'])
+
+
+class ParallelCsvTestCase(TransactionTestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        for i in range(10):
+            Book.objects.create(author=author, title=u'Book %d' % i)
+
+    def export(self, queryset):
+        response = StreamingExcelResponse(queryset, headers=['title'],
+                                          processes=2, shards=3)
+        return b''.join(response.streaming_content)
+
+    def test_shards_are_sent_in_order(self):
+        self.assertEqual(
+            self.export(Book.objects.all()),
+            b'"title"\n' + b''.join([b'"Book %d"\n' % i for i in range(10)]))
+
+    def test_ordering_is_kept(self):
+        self.assertFalse(is_ordered_by_pk(Book.objects.order_by('-id')))
+        self.assertFalse(is_ordered_by_pk(Book.objects.order_by('title')))
+        self.assertTrue(is_ordered_by_pk(Book.objects.order_by('pk')))
+        self.assertTrue(is_ordered_by_pk(Book.objects.all()))
+        self.assertIsNone(get_pk_ranges(Book.objects.order_by('-id'), 3))
+        self.assertEqual(
+            self.export(Book.objects.order_by('-id')),
+            b'"title"\n' + b''.join([b'"Book %d"\n' % i
+                                     for i in reversed(range(10))]))
+
+    def test_pk_ranges(self):
+        pks = list(Book.objects.values_list('pk', flat=True))
+        ranges = get_pk_ranges(Book.objects.all(), 3)
+        self.assertEqual(ranges[0][0], min(pks))
+        self.assertEqual(ranges[-1][1], max(pks) + 1)
+        self.assertEqual(get_pk_ranges(Book.objects.none(), 3), [])
+        self.assertIsNone(get_pk_ranges(Book.objects.all()[:5], 3))
+
+    def test_transaction_of_caller_is_kept(self):
+        with transaction.atomic():
+            Author.objects.create(name=u'Chekhov')
+            self.export(Book.objects.all())
+        self.assertTrue(Author.objects.filter(name=u'Chekhov').exists())
+
+
+class WorkbookResponseTestCase(TransactionTestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        Book.objects.create(author=author, title=u'War and Peace')
+
+    def test_sheets(self):
+        response = WorkbookResponse(
+            [(u'Authors', Author.objects.all()),
+             (u'Books', Book.objects.all())],
+            headers={u'Authors': ['name'], u'Books': ['title']})
+        self.assertEqual(read_xlsx(response.content), [
+            (u'Authors', [[u'name'], [u'Tolstoy']]),
+            (u'Books', [[u'title'], [u'War and Peace']]),
+        ])
+
+    def test_sheets_are_loaded_by_threads(self):
+        with mock.patch('extra_cbv.views.excel.ThreadPool',
+                        wraps=ThreadPool) as pool:
+            tables = load_sheets([(u'Authors', Author.objects.all()),
+                                  (u'Books', Book.objects.all())])
+        pool.assert_called_once_with(2)
+        self.assertEqual([title for title, schema, rows in tables],
+                         [u'Authors', u'Books'])
+        self.assertIsNotNone(connection.connection)
+
+    def test_transaction_of_caller_is_kept(self):
+        with transaction.atomic():
+            Author.objects.create(name=u'Chekhov')
+            response = WorkbookResponse(
+                [(u'Authors', Author.objects.order_by('pk'))],
+                headers={u'Authors': ['name']}, force_xls=True)
+            self.assertEqual(response.status_code, 200)
+        self.assertTrue(Author.objects.filter(name=u'Chekhov').exists())
+
+    def test_transaction_of_caller_is_kept_with_threads(self):
+        with transaction.atomic():
+            Author.objects.create(name=u'Chekhov')
+            load_sheets([(u'Authors', Author.objects.all()),
+                         (u'Books', Book.objects.all())])
+        self.assertTrue(Author.objects.filter(name=u'Chekhov').exists())
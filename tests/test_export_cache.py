@@ -0,0 +1,144 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.cache import FileCache, get_queryset_key
+from extra_cbv.views.simple import ExportView
+
+from .models import Author
+
+
+class AuthorsReport(object):
+    generated = 0
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def generate(self, output):
+        AuthorsReport.generated += 1
+        for author in self.queryset.order_by('pk'):
+            output.write(author.name.encode('utf8') + b'\n')
+
+    def get_file_ext(self):
+        return 'txt'
+
+    def get_mimetype(self):
+        return 'text/plain'
+
+
+class FileCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def write(self, content):
+        return lambda output: output.write(content)
+
+    def test_set_and_get(self):
+        cache = FileCache(self.location)
+        self.assertIsNone(cache.get('key'))
+        f, modified = cache.set('key', self.write(b'data'))
+        self.assertEqual(f.read(), b'data')
+        f.close()
+        f, modified = cache.get('key')
+        self.assertEqual(f.read(), b'data')
+        f.close()
+
+    def test_timeout(self):
+        cache = FileCache(self.location, timeout=60)
+        f, modified = cache.set('key', self.write(b'data'))
+        f.close()
+        old = time.time() - 120
+        os.utime(cache.get_path('key'), (old, old))
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_are_removed(self):
+        cache = FileCache(self.location, max_size=10)
+        for i, key in enumerate(['a', 'b']):
+            cache.set(key, self.write(b'12345'))[0].close()
+            old = time.time() - 100 + i
+            os.utime(cache.get_path(key), (old, old))
+        cache.get('a')[0].close()
+        cache.set('c', self.write(b'12345'))[0].close()
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_queryset_key(self):
+        self.assertEqual(get_queryset_key(Author.objects.filter(pk=1)),
+                         get_queryset_key(Author.objects.filter(pk=1)))
+        self.assertNotEqual(get_queryset_key(Author.objects.filter(pk=1)),
+                            get_queryset_key(Author.objects.filter(pk=2)))
+        self.assertTrue(get_queryset_key(Author.objects.none()))
+
+
+class CachedExportViewTestCase(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.factory = RequestFactory()
+        self.view = ExportView.as_view(
+            builder_class=AuthorsReport, queryset=Author.objects.all(),
+            export_cache=FileCache(self.location))
+        Author.objects.create(name=u'Tolstoy')
+        AuthorsReport.generated = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def get(self, **headers):
+        response = self.view(self.factory.get('/', **headers))
+        if response.status_code == 200:
+            response.content_data = b''.join(response.streaming_content)
+        return response
+
+    def test_cached_export(self):
+        response = self.get()
+        self.assertEqual(response.content_data, b'Tolstoy\n')
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertEqual(self.get().content_data, b'Tolstoy\n')
+        self.assertEqual(AuthorsReport.generated, 1)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_of_data_create_new_entry(self):
+        etag = self.get()['ETag']
+        Author.objects.create(name=u'Chekhov')
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_data, b'Tolstoy\nChekhov\n')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(AuthorsReport.generated, 2)
+
+    def test_builder_is_built_by_get_builder(self):
+        class ChekhovExportView(ExportView):
+            def get_builder(self):
+                builder = super(ChekhovExportView, self).get_builder()
+                builder.queryset = builder.queryset.filter(name=u'Chekhov')
+                return builder
+
+        Author.objects.create(name=u'Chekhov')
+        view = ChekhovExportView.as_view(
+            builder_class=AuthorsReport, queryset=Author.objects.all(),
+            export_cache=FileCache(self.location))
+        response = view(self.factory.get('/'))
+        self.assertEqual(b''.join(response.streaming_content), b'Chekhov\n')
+
+    def test_builder_class_is_required(self):
+        view = ExportView.as_view(queryset=Author.objects.all(),
+                                  export_cache=FileCache(self.location))
+        with self.assertRaises(ImproperlyConfigured):
+            view(self.factory.get('/'))
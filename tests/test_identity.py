@@ -0,0 +1,122 @@
+# coding: utf-8
+import mock
+from django.core.cache import caches
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.actions import UpdateAction
+from extra_cbv.identity import load_object
+from extra_cbv.views.inline import InlineListView
+from extra_cbv.views.json import JsonDetailView
+from extra_cbv.views.mixins import SuperSingleObjectMixin
+
+from .models import Author, Book
+
+
+class AuthorDetailView(SuperSingleObjectMixin, JsonDetailView):
+    model = Author
+
+
+class AuthorBooksView(InlineListView):
+    model = Book
+    master_model = Author
+
+
+class LoadObjectTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.author = Author.objects.create(name=u'Tolstoy')
+        self.factory = RequestFactory()
+
+    def load(self, request, cache_timeout=None):
+        return load_object(
+            request, ('author', self.author.pk),
+            lambda: Author.objects.get(pk=self.author.pk), Author,
+            cache_timeout)
+
+    def test_once_per_request(self):
+        request = self.factory.get('/')
+        with self.assertNumQueries(1):
+            author = self.load(request)
+            self.assertIs(self.load(request), author)
+        with self.assertNumQueries(1):
+            self.assertIsNot(self.load(self.factory.get('/')), author)
+
+    def test_cache_across_requests(self):
+        self.load(self.factory.get('/'), 60)
+        with self.assertNumQueries(0):
+            author = self.load(self.factory.get('/'), 60)
+        self.assertEqual(author.name, u'Tolstoy')
+
+    def test_cache_is_invalidated(self):
+        self.load(self.factory.get('/'), 60)
+        self.author.name = u'Leo Tolstoy'
+        self.author.save()
+        self.assertEqual(self.load(self.factory.get('/'), 60).name,
+                         u'Leo Tolstoy')
+        UpdateAction(name=u'Lev Tolstoy').run(Author.objects.all(),
+                                              [self.author.pk])
+        self.assertEqual(self.load(self.factory.get('/'), 60).name,
+                         u'Lev Tolstoy')
+
+    def test_exceptions_are_not_cached(self):
+        request = self.factory.get('/')
+        load = mock.Mock(side_effect=[Author.DoesNotExist, self.author])
+        with self.assertRaises(Author.DoesNotExist):
+            load_object(request, 'key', load, Author, 60)
+        self.assertEqual(load_object(request, 'key', load, Author, 60),
+                         self.author)
+
+
+class IdentityViewsTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.author = Author.objects.create(name=u'Tolstoy')
+        self.factory = RequestFactory()
+
+    def test_single_object_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            response = AuthorDetailView.as_view()(self.factory.get('/'),
+                                                  pk=self.author.pk)
+        self.assertEqual(response.status_code, 200)
+        view = AuthorDetailView.as_view(object_cache_timeout=60)
+        view(self.factory.get('/'), pk=self.author.pk)
+        with self.assertNumQueries(0):
+            view(self.factory.get('/'), pk=self.author.pk)
+        with self.assertRaises(Http404):
+            view(self.factory.get('/'), pk=0)
+
+    def test_master_object(self):
+        view = AuthorBooksView(kwargs={'pk': self.author.pk},
+                               request=self.factory.get('/'))
+        with self.assertNumQueries(1):
+            master = view.get_master_object()
+            self.assertIs(view.get_master_object(), master)
+        view = AuthorBooksView(kwargs={'pk': 0}, request=self.factory.get('/'))
+        with self.assertRaises(Http404):
+            view.get_master_object()
+
+    def test_master_object_cache(self):
+        request = self.factory.get('/')
+        AuthorBooksView(kwargs={'pk': self.author.pk}, request=request,
+                        master_cache_timeout=60).get_master_object()
+        view = AuthorBooksView(kwargs={'pk': self.author.pk},
+                               request=self.factory.get('/'),
+                               master_cache_timeout=60)
+        with self.assertNumQueries(0):
+            self.assertEqual(view.get_master_object(), self.author)
+
+    def test_cached_models_are_tracked(self):
+        path = 'extra_cbv.views.%s.track_models'
+        with mock.patch(path % 'mixins') as track_models:
+            AuthorDetailView.as_view()
+            self.assertFalse(track_models.called)
+            AuthorDetailView.as_view(object_cache_timeout=60)
+            track_models.assert_called_once_with([Author])
+        with mock.patch(path % 'inline') as track_models:
+            AuthorBooksView.as_view()
+            self.assertFalse(track_models.called)
+            AuthorBooksView.as_view(master_cache_timeout=60)
+            track_models.assert_called_once_with([Author])
@@ -0,0 +1,234 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase
+
+from extra_cbv import jobs
+from extra_cbv.views.simple import ExportJobView, ExportView
+
+from .models import Author
+from .test_reports import Report
+
+
+class PendingJobBackend(jobs.BaseJobBackend):
+    """
+    Backend which keeps submitted jobs without running them
+    """
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args):
+        self.submitted.append((func, args))
+
+    def run_all(self):
+        for func, args in self.submitted:
+            func(*args)
+        self.submitted = []
+
+
+def get_dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class JobStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.store = jobs.FileSystemJobStore(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_active_job_is_shared(self):
+        job_id, created = self.store.create('key', name=u'first')
+        self.assertTrue(created)
+        self.assertEqual(self.store.create('key'), (job_id, False))
+        self.assertEqual(self.store.get(job_id)['name'], u'first')
+
+        self.store.release('key', job_id)
+        new_id, created = self.store.create('key')
+        self.assertTrue(created)
+        self.assertNotEqual(new_id, job_id)
+
+    def test_finished_job_is_not_shared(self):
+        job_id, created = self.store.create('key')
+        self.store.update(job_id, status=jobs.STATUS_DONE)
+        new_id, created = self.store.create('key')
+        self.assertTrue(created)
+
+    def test_job_of_dead_process_fails(self):
+        job_id, created = self.store.create('key')
+        self.store.update(job_id, status=jobs.STATUS_RUNNING,
+                          pid=get_dead_pid())
+        job = self.store.get(job_id)
+        self.assertEqual(job['status'], jobs.STATUS_FAILED)
+        self.assertTrue(job['error'])
+
+        new_id, created = self.store.create('key')
+        self.assertTrue(created)
+        self.assertNotEqual(new_id, job_id)
+
+    def test_job_of_other_host_is_active(self):
+        job_id, created = self.store.create('key')
+        self.store.update(job_id, status=jobs.STATUS_RUNNING,
+                          pid=get_dead_pid(), host=u'other-host')
+        self.assertEqual(self.store.get(job_id)['status'],
+                         jobs.STATUS_RUNNING)
+        self.assertEqual(self.store.create('key'), (job_id, False))
+
+    def test_cleanup(self):
+        done_id, created = self.store.create('done')
+        self.store.update(done_id, status=jobs.STATUS_DONE)
+        self.store.release('done', done_id)
+        with self.store.open_result(done_id, 'wb') as f:
+            f.write(b'data')
+        active_id, created = self.store.create('active')
+        recent_id, created = self.store.create('recent')
+        self.store.update(recent_id, status=jobs.STATUS_DONE)
+
+        old = time.time() - self.store.result_timeout - 1
+        for name in os.listdir(self.location):
+            if name.startswith(recent_id):
+                continue
+            os.utime(os.path.join(self.location, name), (old, old))
+        self.store.cleanup()
+
+        self.assertIsNone(self.store.get(done_id))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.location, '%s.data' % done_id)))
+        self.assertIsNotNone(self.store.get(active_id))
+        self.assertIsNotNone(self.store.get(recent_id))
+
+    def test_invalid_job_id(self):
+        self.assertIsNone(self.store.get('../secret'))
+        self.assertIsNone(self.store.get(None))
+
+
+class QuerysetReport(Report):
+
+    def __init__(self, queryset):
+        super(QuerysetReport, self).__init__()
+
+
+class BackgroundExportView(ExportView):
+    builder_class = QuerysetReport
+    run_in_background = True
+
+
+class ExportJobTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.location = tempfile.mkdtemp()
+        self.store = jobs.FileSystemJobStore(self.location)
+        self.backend = PendingJobBackend()
+        self.user = User.objects.create_user('user')
+        self.other_user = User.objects.create_user('other')
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def start_export(self, user, data=None):
+        request = self.factory.post('/', data or {})
+        request.user = user
+        response = BackgroundExportView.as_view(
+            job_store=self.store, job_backend=self.backend)(request)
+        self.assertEqual(response.status_code, 202)
+        return json.loads(response.content.decode('utf8'))['job']
+
+    def get_job(self, user, job_id):
+        request = self.factory.get('/')
+        request.user = user
+        return ExportJobView.as_view(job_store=self.store)(request,
+                                                           job_id=job_id)
+
+    def test_identical_requests_share_job(self):
+        job_id = self.start_export(
+            self.user, {'format': 'csv', 'csrfmiddlewaretoken': 'a'})
+        self.assertEqual(self.start_export(
+            self.user, {'format': 'csv', 'csrfmiddlewaretoken': 'b'}),
+            job_id)
+        self.assertNotEqual(self.start_export(
+            self.user, {'format': 'xls', 'csrfmiddlewaretoken': 'c'}),
+            job_id)
+        self.assertNotEqual(self.start_export(
+            self.other_user, {'format': 'csv'}), job_id)
+        self.assertEqual(len(self.backend.submitted), 3)
+
+    def test_status_and_result(self):
+        job_id = self.start_export(self.user)
+        response = self.get_job(self.user, job_id)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content.decode('utf8'))['status'],
+                         jobs.STATUS_PENDING)
+
+        self.backend.run_all()
+        response = self.get_job(self.user, job_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment;filename="report.txt"')
+
+    def test_job_of_other_user_is_not_found(self):
+        job_id = self.start_export(self.user)
+        self.backend.run_all()
+        self.assertRaises(Http404, self.get_job, self.other_user, job_id)
+        self.assertRaises(Http404, self.get_job, AnonymousUser(), job_id)
+
+    def test_unknown_job(self):
+        self.assertRaises(Http404, self.get_job, self.user, 'f' * 32)
+
+    def test_owner_of_anonymous_user(self):
+        from django.contrib.sessions.backends.signed_cookies import \
+            SessionStore
+
+        request = self.factory.post('/')
+        request.user = AnonymousUser()
+        self.assertIsNone(jobs.get_job_owner(request))
+        request.session = SessionStore()
+        self.assertIsNone(jobs.get_job_owner(request, create_session=False))
+        owner = jobs.get_job_owner(request)
+        self.assertEqual(owner, u'session:%s' % request.session.session_key)
+        self.assertTrue(request.session.modified)
+        request.user = self.user
+        self.assertEqual(jobs.get_job_owner(request),
+                         u'user:%s' % self.user.pk)
+
+
+class ThreadPoolJobBackendTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_job_runs_in_thread(self):
+        Author.objects.create(name=u'Tolstoy')
+        connection.ensure_connection()
+        store = jobs.FileSystemJobStore(self.location)
+        backend = jobs.ThreadPoolJobBackend(1)
+
+        def build(output):
+            output.write(Author.objects.get().name.encode('utf8'))
+
+        job_id, job = jobs.start_job(store, backend, 'key', build)
+        backend.pool.close()
+        backend.pool.join()
+        self.assertEqual(store.get(job_id)['status'], jobs.STATUS_DONE)
+        with store.open_result(job_id) as f:
+            self.assertEqual(f.read(), b'Tolstoy')
+        # connection of the caller is not closed
+        self.assertIsNotNone(connection.connection)
@@ -0,0 +1,312 @@
+# coding: utf-8
+import datetime
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.utils import six
+
+from extra_cbv.encoders import MEDIA_TYPES, register_media_type
+from extra_cbv.views.json import CacheResponseMixin, JsonDetailView, \
+    JsonListView
+
+from .models import Author, Book
+
+
+class AuthorListView(JsonListView):
+    model = Author
+    ordering = 'pk'
+
+
+class StreamingJsonListViewTestCase(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            Author.objects.create(name=u'Author "%d"' % i)
+        self.factory = RequestFactory()
+
+    def get_content(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def test_same_data(self):
+        request = self.factory.get('/')
+        expected = json.loads(AuthorListView.as_view()(request).content)
+        response = AuthorListView.as_view(stream=True,
+                                          stream_chunk_size=2)(request)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(self.get_content(response)), expected)
+        self.assertEqual(len(expected['object_list']), 5)
+
+    def test_chunks(self):
+        view = AuthorListView(stream_chunk_size=2,
+                              request=self.factory.get('/'), kwargs={})
+        chunks = list(view.iter_serialize_object_list(
+            Author.objects.order_by('pk'), {}))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_pagination(self):
+        request = self.factory.get('/', {'page': 2})
+        view = AuthorListView.as_view(paginate_by=2)
+        expected = json.loads(view(request).content)
+        response = AuthorListView.as_view(paginate_by=2, stream=True)(request)
+        data = json.loads(self.get_content(response))
+        self.assertEqual(data, expected)
+        self.assertEqual(data['pagination'],
+                         {'next': 3, 'previous': 1, 'count': 3})
+        self.assertEqual(len(data['object_list']), 2)
+
+    def test_empty(self):
+        Author.objects.all().delete()
+        response = AuthorListView.as_view(stream=True)(self.factory.get('/'))
+        self.assertEqual(json.loads(self.get_content(response)),
+                         {'object_list': []})
+
+    def test_context_object_name(self):
+        response = AuthorListView.as_view(
+            stream=True, context_object_name='authors')(self.factory.get('/'))
+        data = json.loads(self.get_content(response))
+        self.assertEqual(len(data['authors']), 5)
+
+
+class BookListView(JsonListView):
+    model = Book
+    ordering = 'pk'
+    allowed_fields = ['title', 'author__name', 'price']
+
+
+class SerializeFieldsTestCase(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        Book.objects.create(author=author, title=u'War and Peace')
+        self.factory = RequestFactory()
+
+    def get_view(self, **params):
+        return BookListView(request=self.factory.get('/', params), kwargs={})
+
+    def test_allowed_fields_order(self):
+        view = self.get_view(fields='price, unknown,author__name,title,price')
+        self.assertEqual(view.get_fields(), ['title', 'author__name',
+                                             'price'])
+        self.assertEqual(self.get_view(fields='unknown').get_fields(), [])
+        self.assertIsNone(self.get_view().get_fields())
+
+    def test_response(self):
+        request = self.factory.get('/', {'fields': 'author__name,title'})
+        with self.assertNumQueries(1):
+            response = BookListView.as_view()(request)
+        [item] = json.loads(response.content)['object_list']
+        self.assertEqual(item, {'pk': Book.objects.get().pk,
+                                'title': u'War and Peace',
+                                'author__name': u'Tolstoy'})
+
+
+class BookDetailView(JsonDetailView):
+    model = Book
+
+
+class VersionedBookDetailView(BookDetailView):
+    version_field = 'updated_at'
+
+
+class ConditionalDetailTestCase(TestCase):
+
+    def setUp(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        self.book = Book.objects.create(author=author, title=u'Anna')
+        self.factory = RequestFactory()
+
+    def get(self, view_class, **headers):
+        request = self.factory.get('/', **headers)
+        return view_class.as_view()(request, pk=self.book.pk)
+
+    def test_content_etag(self):
+        response = self.get(BookDetailView)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        response = self.get(BookDetailView, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Accept', response['Vary'])
+        Book.objects.filter(pk=self.book.pk).update(title=u'Karenina')
+        response = self.get(BookDetailView, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_etag(self):
+        response = self.get(VersionedBookDetailView)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        # only the version is read for 304 response
+        with self.assertNumQueries(1):
+            response = self.get(VersionedBookDetailView,
+                                HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(1):
+            response = self.get(VersionedBookDetailView,
+                                HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Last-Modified'], last_modified)
+        self.book.updated_at += datetime.timedelta(seconds=5)
+        Book.objects.filter(pk=self.book.pk).update(
+            updated_at=self.book.updated_at)
+        response = self.get(VersionedBookDetailView, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_etag_depends_on_media_type(self):
+        etag = self.get(VersionedBookDetailView)['ETag']
+        response = self.get(VersionedBookDetailView, HTTP_IF_NONE_MATCH=etag,
+                            HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_found(self):
+        with self.assertRaises(Http404):
+            VersionedBookDetailView.as_view()(self.factory.get('/'), pk=0)
+
+
+class CachedAuthorListView(CacheResponseMixin, AuthorListView):
+    pass
+
+
+class NdjsonListViewTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.authors = [Author.objects.create(name=u'Author %d' % i)
+                        for i in range(3)]
+        self.factory = RequestFactory()
+
+    def get_lines(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_accept(self):
+        request = self.factory.get('/', HTTP_ACCEPT='application/x-ndjson')
+        response = AuthorListView.as_view(paginate_by=1)(request)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual([item['pk'] for item in self.get_lines(response)],
+                         [author.pk for author in self.authors])
+
+    def test_not_accepted(self):
+        for accept in ['application/x-ndjson;q=0, application/json',
+                       'application/json, application/x-ndjson;q=0.1',
+                       '*/*, application/x-ndjson;q=0.5',
+                       'application/x-ndjson-seq', 'application/json',
+                       '*/*']:
+            request = self.factory.get('/', HTTP_ACCEPT=accept)
+            response = AuthorListView.as_view()(request)
+            self.assertFalse(response.streaming, accept)
+            self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_preferred(self):
+        for accept in ['application/json;q=0.5, application/x-ndjson',
+                       '*/*;q=0.1, application/x-ndjson']:
+            request = self.factory.get('/', HTTP_ACCEPT=accept)
+            response = AuthorListView.as_view()(request)
+            self.assertTrue(response.streaming, accept)
+
+    def test_cached_view(self):
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        view = CachedAuthorListView.as_view()
+        self.assertFalse(view(request).streaming)
+        request = self.factory.get('/', HTTP_ACCEPT='application/x-ndjson')
+        request.user = AnonymousUser()
+        response = view(request)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(self.get_lines(response)), 3)
+
+    def test_since(self):
+        request = self.factory.get('/', {'since': self.authors[0].pk})
+        response = AuthorListView.as_view(ndjson=True)(request)
+        self.assertEqual([item['pk'] for item in self.get_lines(response)],
+                         [author.pk for author in self.authors[1:]])
+
+    def test_since_field(self):
+        request = self.factory.get('/', {'since': u'Author 1'})
+        response = AuthorListView.as_view(ndjson=True, since_field='name')(
+            request)
+        self.assertEqual([item['name'] for item in self.get_lines(response)],
+                         [u'Author 2'])
+
+    def test_invalid_since(self):
+        request = self.factory.get('/', {'since': u'x'})
+        response = AuthorListView.as_view(ndjson=True)(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class MediaTypesTestCase(TestCase):
+
+    def setUp(self):
+        Author.objects.create(name=u'Tolstoy',
+                              birth_date=datetime.date(1828, 9, 9))
+        self.factory = RequestFactory()
+
+    def get(self, accept, **initkwargs):
+        request = self.factory.get('/', HTTP_ACCEPT=accept)
+        return AuthorListView.as_view(**initkwargs)(request)
+
+    def test_msgpack(self):
+        import msgpack
+
+        expected = json.loads(self.get('application/json').content)
+        for media_type in ('application/msgpack', 'application/x-msgpack'):
+            response = self.get(media_type)
+            self.assertEqual(response['Content-Type'], media_type)
+            self.assertIn('Accept', response['Vary'])
+            data = msgpack.unpackb(response.content, raw=False)
+            self.assertEqual(data, expected)
+            item = data['object_list'][0]
+            self.assertTrue(all(isinstance(key, six.text_type)
+                                for key in list(data) + list(item)))
+            self.assertIsInstance(item['name'], six.text_type)
+
+    def test_quality(self):
+        response = self.get('application/msgpack;q=0.5, application/json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response = self.get('application/msgpack, application/json;q=0.5')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        response = self.get('application/msgpack;q=0, text/html')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_media_ranges(self):
+        for accept in ('application/msgpack;q=0.1, */*',
+                       'application/msgpack;q=0.1, application/*'):
+            response = self.get(accept)
+            self.assertEqual(response['Content-Type'], 'application/json')
+        response = self.get('application/msgpack, */*;q=0.5')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        response = self.get('application/json;q=0.2, application/*;q=0.5')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+
+    def test_default(self):
+        for accept in ('', '*/*', 'text/html'):
+            response = self.get(accept)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('Accept', response['Vary'])
+
+    def test_not_installed(self):
+        register_media_type('application/x-missing', None,
+                            'extra_cbv_missing_module')
+        try:
+            response = self.get(
+                'application/x-missing',
+                media_types=['application/json', 'application/x-missing'])
+        finally:
+            del MEDIA_TYPES['application/x-missing']
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_streaming_is_json_only(self):
+        response = self.get('application/msgpack', stream=True)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
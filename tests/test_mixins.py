@@ -0,0 +1,69 @@
+# coding: utf-8
+import json
+
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.views.json import JsonListView
+from extra_cbv.views.mixins import QuerysetPipelineMixin
+
+from .models import Author
+
+
+class CountingSearchView(JsonListView):
+    model = Author
+    ordering = 'pk'
+    searches = 0
+
+    def get_queryset(self):
+        self.searches += 1
+        return super(CountingSearchView, self).get_queryset().filter(
+            name__contains=self.request.GET.get('search', u''))
+
+
+class PipelineView(QuerysetPipelineMixin, CountingSearchView):
+    pass
+
+
+class QuerysetPipelineTestCase(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            Author.objects.create(name=u'author %d' % i)
+        self.factory = RequestFactory()
+
+    def get_view(self, view_class, **initkwargs):
+        view = view_class(**initkwargs)
+        view.request = self.factory.get('/', {'search': u'author'})
+        view.args, view.kwargs = (), {}
+        return view
+
+    def test_queryset_is_built_once(self):
+        view = self.get_view(PipelineView)
+        queryset = view.get_queryset()
+        self.assertIs(view.get_queryset(), queryset)
+        self.assertEqual(view.searches, 1)
+        view = self.get_view(CountingSearchView)
+        self.assertIsNot(view.get_queryset(), view.get_queryset())
+
+    def test_rows_are_reused(self):
+        view = self.get_view(PipelineView)
+        self.assertEqual(len(view.get_queryset()), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(view.get_queryset().count(), 5)
+            self.assertEqual(len(view.get_queryset()), 5)
+
+    def test_not_paginated_list_is_loaded_once(self):
+        view = PipelineView.as_view(allow_empty=False)
+        with self.assertNumQueries(1):
+            response = view(self.factory.get('/', {'search': u'author'}))
+        self.assertEqual(len(json.loads(response.content)['object_list']),
+                         5)
+
+    def test_paginated_list_queries(self):
+        # exists(), count and the page
+        view = PipelineView.as_view(allow_empty=False, paginate_by=2)
+        with self.assertNumQueries(3):
+            response = view(self.factory.get('/', {'search': u'author',
+                                                   'page': 2}))
+        self.assertEqual(len(json.loads(response.content)['object_list']),
+                         2)
@@ -0,0 +1,163 @@
+# coding: utf-8
+import datetime
+import json
+
+import mock
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.pagination import CachedCountPaginator, \
+    CountlessPaginator, CursorPaginator, EstimatedCountPaginator, \
+    InvalidCursor, encode_cursor
+from extra_cbv.views.json import JsonListView
+from extra_cbv.views.mixins import CursorPaginationMixin
+from extra_cbv.views.simple import PaginatedListView
+
+from .models import Author, Book
+
+
+class AuthorCursorListView(CursorPaginationMixin, JsonListView):
+    model = Author
+    paginate_by = 2
+    cursor_ordering = ['-kind', 'name']
+
+
+class CursorPaginatorTestCase(TestCase):
+
+    def setUp(self):
+        # duplicated names check the pk tie breaker
+        for name in [u'b', u'a', u'c', u'a', u'd', u'b', u'e']:
+            Author.objects.create(name=name)
+        self.expected = list(Author.objects.order_by('name', 'pk'))
+
+    def iter_pages(self, paginator):
+        page = paginator.page()
+        yield page
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            yield page
+
+    def test_forward(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ['name'])
+        pages = list(self.iter_pages(paginator))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([obj for page in pages for obj in page],
+                         self.expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_backward(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ['name'])
+        last = list(self.iter_pages(paginator))[-1]
+        page = paginator.page(last.previous_cursor)
+        self.assertEqual(list(page), self.expected[3:6])
+        self.assertEqual(list(paginator.page(page.next_cursor)),
+                         self.expected[6:])
+        page = paginator.page(page.previous_cursor)
+        self.assertEqual(list(page), self.expected[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_descending(self):
+        paginator = CursorPaginator(Author.objects.all(), 2, ['-name'])
+        pages = list(self.iter_pages(paginator))
+        self.assertEqual([obj for page in pages for obj in page],
+                         list(Author.objects.order_by('-name', '-pk')))
+
+    def test_queries(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ['name'])
+        page = paginator.page()
+        with self.assertNumQueries(1):
+            paginator.page(page.next_cursor)
+
+    def test_invalid_cursor(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ['name'])
+        for cursor in ['invalid', encode_cursor(False, [u'a']),
+                       encode_cursor(False, [u'a', u'x'])]:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_invalid_ordering(self):
+        for ordering in (['author__name'], ['unknown']):
+            with self.assertRaises(ImproperlyConfigured):
+                CursorPaginator(Book.objects.all(), 3, ordering)
+
+    def test_nullable_ordering(self):
+        Author.objects.update(birth_date=datetime.date(2000, 1, 1))
+        with self.assertRaises(ImproperlyConfigured):
+            CursorPaginator(Author.objects.all(), 3, ['birth_date'])
+
+    def test_view(self):
+        factory = RequestFactory()
+        view = AuthorCursorListView.as_view()
+        data = json.loads(view(factory.get('/')).content)
+        self.assertEqual(len(data['object_list']), 2)
+        self.assertIsNone(data['pagination']['previous'])
+        data = json.loads(view(factory.get(
+            '/', {'cursor': data['pagination']['next']})).content)
+        self.assertEqual([item['pk'] for item in data['object_list']],
+                         [obj.pk for obj in self.expected[2:4]])
+        with self.assertRaises(Http404):
+            view(factory.get('/', {'cursor': 'invalid'}))
+
+
+class CountPaginatorsTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        for i in range(5):
+            Author.objects.create(name=u'Author %d' % i)
+
+    def test_cached_count(self):
+        queryset = Author.objects.order_by('pk')
+        with self.assertNumQueries(1):
+            self.assertEqual(CachedCountPaginator(queryset, 2).count, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset.all(), 2).count,
+                             5)
+        with self.assertNumQueries(1):
+            self.assertEqual(CachedCountPaginator(
+                queryset.filter(name=u'Author 1'), 2).count, 1)
+        self.assertEqual(CachedCountPaginator([1, 2, 3], 2).count, 3)
+
+    def test_estimated_count(self):
+        # sqlite has no estimates, so the count is exact
+        paginator = EstimatedCountPaginator(Author.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.count_is_estimated)
+        with mock.patch('extra_cbv.pagination.estimate_count',
+                        return_value=200000):
+            paginator = EstimatedCountPaginator(
+                Author.objects.filter(pk__gt=0).order_by('pk'), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 200000)
+            self.assertTrue(paginator.count_is_estimated)
+
+    def test_countless(self):
+        paginator = CountlessPaginator(Author.objects.order_by('pk'), 2)
+        with self.assertNumQueries(1):
+            page = paginator.page(1)
+            self.assertEqual(len(page.object_list), 2)
+            self.assertTrue(page.has_next())
+        page = paginator.page(3)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertFalse(page.has_next())
+        self.assertEqual((page.start_index(), page.end_index()), (5, 5))
+        self.assertIsNone(paginator.count)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page('x')
+        paginator = CountlessPaginator(Author.objects.none().order_by('pk'),
+                                       2)
+        self.assertEqual(len(paginator.page(1).object_list), 0)
+
+    def test_countless_pages(self):
+        view = PaginatedListView()
+        paginator = CountlessPaginator(Author.objects.order_by('pk'), 1)
+        self.assertEqual(view.get_pages(paginator, paginator.page(1)),
+                         [(1, 1), (2, 2), ('...', None)])
+        self.assertEqual(view.get_pages(paginator, paginator.page(5)),
+                         [(1, 1), ('...', None), (3, 3), (4, 4), (5, 5)])
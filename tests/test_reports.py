@@ -0,0 +1,93 @@
+# coding: utf-8
+from django.test import RequestFactory, TestCase
+
+from extra_cbv.views.simple import DownloadReportView, parse_range_header
+
+
+class Report(object):
+
+    def __init__(self, content=b'0123456789'):
+        self.content = content
+
+    def generate(self, output):
+        output.write(self.content)
+
+    def get_file_ext(self):
+        return 'txt'
+
+    def get_mimetype(self):
+        return 'text/plain'
+
+
+class StreamedReport(Report):
+
+    def generate(self):
+        for i in range(3):
+            yield b'chunk %d\n' % i
+
+
+class ReportView(DownloadReportView):
+    builder_class = Report
+
+
+class DownloadReportViewTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_file_response(self):
+        response = ReportView.as_view()(self.factory.get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment;filename="report.txt"')
+
+    def test_spooled_output(self):
+        view = ReportView(spool_max_size=4)
+        output = view.get_output()
+        output.write(b'0123456789')
+        self.assertTrue(output._rolled)
+        output.close()
+
+    def test_streamed_report(self):
+        response = ReportView.as_view(builder_class=StreamedReport)(
+            self.factory.get('/'))
+        self.assertEqual(list(response.streaming_content),
+                         [b'chunk 0\n', b'chunk 1\n', b'chunk 2\n'])
+        self.assertFalse(response.has_header('Accept-Ranges'))
+
+    def test_range(self):
+        response = ReportView.as_view()(
+            self.factory.get('/', HTTP_RANGE='bytes=2-5'))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_suffix_range(self):
+        response = ReportView.as_view()(
+            self.factory.get('/', HTTP_RANGE='bytes=-3'))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_unsatisfiable_range(self):
+        response = ReportView.as_view()(
+            self.factory.get('/', HTTP_RANGE='bytes=20-'))
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_conditional_range_gets_whole_file(self):
+        response = ReportView.as_view()(self.factory.get(
+            '/', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"etag"'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_parse_range_header(self):
+        self.assertEqual(parse_range_header('bytes=0-', 10), (0, 9))
+        self.assertEqual(parse_range_header('bytes=5-100', 10), (5, 9))
+        self.assertEqual(parse_range_header('bytes=-20', 10), (0, 9))
+        self.assertIsNone(parse_range_header('bytes=5-2', 10))
+        self.assertIsNone(parse_range_header('bytes=0-1,3-4', 10))
+        self.assertIsNone(parse_range_header('items=0-1', 10))
@@ -0,0 +1,170 @@
+# coding: utf-8
+import json
+import weakref
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+
+from extra_cbv.search import backends as search_backends
+from extra_cbv.search.backends import IContainsSearchBackend, \
+    InvertedIndexSearchBackend, SQLiteSearchBackend, get_search_backend, \
+    tokenize
+from extra_cbv.search.models import FTS_TABLE
+from extra_cbv.views.json import JsonListView
+from extra_cbv.views.mixins import SearchMixin
+
+from .models import Author, Book
+
+
+def create_fts_table():
+    """
+    Create FTS5 table like the migration does, tests can run without
+    migrations. Return False if SQLite is built without FTS5.
+    """
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5('
+                'content_type UNINDEXED, object_id UNINDEXED, body)' %
+                connection.ops.quote_name(FTS_TABLE))
+    except DatabaseError:
+        return False
+    return True
+
+
+class IndexSearchBackendMixin(object):
+    backend_class = None
+
+    def setUp(self):
+        self.backend = self.backend_class()
+        self.backend.register(Book, ['title', 'author__name'])
+        self.tolstoy = Author.objects.create(name=u'Leo Tolstoy')
+        self.war = Book.objects.create(author=self.tolstoy,
+                                       title=u'War and Peace')
+        self.anna = Book.objects.create(author=self.tolstoy,
+                                        title=u'Anna Karenina')
+
+    def tearDown(self):
+        # receivers are weak references, they are gone with the backend
+        backend = weakref.ref(self.backend)
+        del self.backend
+        self.assertIsNone(backend())
+
+    def search(self, query):
+        return list(self.backend.search(Book.objects.all(), query, None))
+
+    def test_search(self):
+        self.assertEqual(self.search(u'peace'), [self.war])
+        self.assertEqual(self.search(u'WAR peace'), [self.war])
+        self.assertEqual(self.search(u'war anna'), [])
+        self.assertEqual(set(self.search(u'tolstoy')),
+                         set([self.war, self.anna]))
+
+    def test_save_and_delete(self):
+        self.war.title = u'War'
+        self.war.save()
+        self.assertEqual(self.search(u'peace'), [])
+        self.anna.delete()
+        self.assertEqual(self.search(u'tolstoy'), [self.war])
+
+    def test_related_object_saved(self):
+        self.tolstoy.name = u'Lev Tolstoy'
+        self.tolstoy.save()
+        self.assertEqual(self.search(u'leo'), [])
+        self.assertEqual(set(self.search(u'lev')),
+                         set([self.war, self.anna]))
+
+    def test_reindex(self):
+        Author.objects.filter(pk=self.tolstoy.pk).update(name=u'Lev')
+        self.assertEqual(self.search(u'lev'), [])
+        self.backend.reindex(Book)
+        self.assertEqual(len(self.search(u'lev')), 2)
+
+    def test_not_registered(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.backend.search(Author.objects.all(), u'leo', None)
+
+    def test_many_valued_lookups(self):
+        for lookup in ('tags__name', 'books__title', 'unknown__name'):
+            with self.assertRaises(ImproperlyConfigured):
+                self.backend.register(Author if lookup == 'books__title'
+                                      else Book, [lookup])
+
+
+class InvertedIndexSearchBackendTestCase(IndexSearchBackendMixin, TestCase):
+    backend_class = InvertedIndexSearchBackend
+
+    def test_rank(self):
+        other = Book.objects.create(author=self.tolstoy,
+                                    title=u'War, war and war')
+        self.assertEqual(self.search(u'war'), [other, self.war])
+
+
+class SQLiteSearchBackendTestCase(IndexSearchBackendMixin, TestCase):
+    backend_class = SQLiteSearchBackend
+
+    def setUp(self):
+        if not create_fts_table():
+            self.skipTest('SQLite is built without FTS5')
+        super(SQLiteSearchBackendTestCase, self).setUp()
+
+
+class IContainsSearchBackendTestCase(TestCase):
+
+    def test_search(self):
+        author = Author.objects.create(name=u'Tolstoy')
+        book = Book.objects.create(author=author, title=u'War and Peace')
+        backend = IContainsSearchBackend()
+        self.assertEqual(list(backend.search(
+            Book.objects.all(), u'tolst', ['title', 'author__name'])), [book])
+        self.assertEqual(list(backend.search(
+            Book.objects.all(), u'anna', ['title'])), [])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize(u'War, and PEACE!'),
+                         [u'war', u'and', u'peace'])
+
+
+class BookSearchView(SearchMixin, JsonListView):
+    model = Book
+    search_fields = ['title']
+
+    def get_context_data(self, **kwargs):
+        # SearchMixin context is added to the list view context
+        context = JsonListView.get_context_data(self, **kwargs)
+        return SearchMixin.get_context_data(self, **context)
+
+
+@override_settings(EXTRA_CBV_SEARCH_BACKEND=
+                   'extra_cbv.search.backends.InvertedIndexSearchBackend')
+class SearchMixinTestCase(TestCase):
+
+    def setUp(self):
+        get_search_backend().register(Book, ['title', 'author__name'])
+        author = Author.objects.create(name=u'Tolstoy')
+        self.war = Book.objects.create(author=author, title=u'War and Peace')
+        Book.objects.create(author=author, title=u'Anna Karenina')
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        # receivers of the shared backend are gone with it
+        search_backends._backends.clear()
+
+    def get_pks(self, **params):
+        response = BookSearchView.as_view()(self.factory.get('/', params))
+        return [item['pk'] for item in
+                json.loads(response.content)['object_list']]
+
+    def test_backend_is_shared(self):
+        backend = get_search_backend()
+        self.assertIsInstance(backend, InvertedIndexSearchBackend)
+        self.assertIs(get_search_backend(), backend)
+        self.assertIs(get_search_backend(InvertedIndexSearchBackend), backend)
+        self.assertIsNot(get_search_backend(SQLiteSearchBackend), backend)
+
+    def test_search_by_setting(self):
+        self.assertEqual(self.get_pks(search=u'peace'), [self.war.pk])
+        # registered fields are searched, not search_fields of the view
+        self.assertEqual(len(self.get_pks(search=u'tolstoy')), 2)
+        self.assertEqual(len(self.get_pks()), 2)
@@ -0,0 +1,165 @@
+# coding: utf-8
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase
+
+from extra_cbv.serializers import PythonSerializer, \
+    get_serialization_plan, iter_serialize, serialize, simple_serialize
+
+from .models import Author, Book, Tag
+
+
+def reference_serialize(objects, **options):
+    serializer = PythonSerializer()
+    serializer.serialize(objects, **options)
+    return serializer.getvalue()
+
+
+class SerializerTestCase(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(
+            name=u'Tolstoy', kind=2, birth_date=datetime.date(1828, 9, 9))
+        Author.objects.create(name=u'Chekhov')
+        self.tag = Tag.objects.create(name=u'novel')
+        for i in range(3):
+            book = Book.objects.create(author=self.author,
+                                       title=u'Book %d' % i,
+                                       price=Decimal('%d.50' % i))
+            if i:
+                book.tags.add(self.tag)
+
+    def assertSameOutput(self, data, expected):
+        # keys order is compared too
+        self.assertEqual(json.dumps(data, cls=DjangoJSONEncoder),
+                         json.dumps(expected, cls=DjangoJSONEncoder))
+
+    def test_queryset(self):
+        for model in (Author, Book):
+            queryset = model.objects.order_by('pk')
+            with self.assertNumQueries(1 if model is Author else 2):
+                data = simple_serialize(queryset)
+            self.assertSameOutput(data, reference_serialize(queryset))
+
+    def test_objects(self):
+        books = list(Book.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            data = simple_serialize(books)
+        self.assertSameOutput(data, reference_serialize(books))
+
+    def test_fields(self):
+        queryset = Book.objects.order_by('pk')
+        self.assertSameOutput(
+            simple_serialize(queryset, fields=['title', 'author']),
+            reference_serialize(queryset, fields=['title', 'author']))
+        self.assertSameOutput(
+            simple_serialize(list(queryset), fields=['price']),
+            reference_serialize(queryset, fields=['price']))
+
+    def test_values(self):
+        [data] = simple_serialize(Author.objects.filter(pk=self.author.pk))
+        self.assertEqual(data['pk'], self.author.pk)
+        self.assertEqual(data['birth_date'], datetime.date(1828, 9, 9))
+        self.assertEqual(data['kind'], 2)
+
+    def test_other_options_use_serializer(self):
+        queryset = Author.objects.order_by('pk')
+        self.assertSameOutput(
+            simple_serialize(queryset, use_natural_foreign_keys=True),
+            reference_serialize(queryset, use_natural_foreign_keys=True))
+
+    def test_iter_serialize(self):
+        queryset = Book.objects.order_by('pk')
+        chunks = list(iter_serialize(queryset, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertIsNone(queryset._result_cache)
+        self.assertSameOutput(sum(chunks, []),
+                              reference_serialize(queryset))
+
+    def test_serialize_single_object(self):
+        self.assertSameOutput(serialize(self.author),
+                              reference_serialize([self.author]))
+
+
+class RelationsTestCase(TestCase):
+
+    def setUp(self):
+        self.tags = [Tag.objects.create(name=u'Tag %d' % i) for i in range(3)]
+        self.authors = []
+        for i in range(3):
+            author = Author.objects.create(name=u'Author %d' % i)
+            self.authors.append(author)
+            for j in range(i):
+                book = Book.objects.create(author=author,
+                                           title=u'Book %d.%d' % (i, j))
+                book.tags.set(self.tags[:j + 1])
+
+    def get_expected_books(self):
+        return [[book.pk for book in author.books.order_by('pk')]
+                for author in self.authors]
+
+    def test_many_to_many(self):
+        queryset = Book.objects.order_by('pk')
+        expected = reference_serialize(queryset.all())
+        with self.assertNumQueries(2):
+            data = simple_serialize(queryset.all())
+        self.assertEqual(data, expected)
+        books = list(queryset.all())
+        with self.assertNumQueries(1):
+            data = simple_serialize(books)
+        self.assertEqual(data, expected)
+
+    def test_reverse_relation(self):
+        queryset = Author.objects.order_by('pk')
+        with self.assertNumQueries(2):
+            data = simple_serialize(queryset, relations=['books'])
+        self.assertEqual([item['books'] for item in data],
+                         self.get_expected_books())
+
+    def test_prefetched(self):
+        authors = list(Author.objects.order_by('pk').prefetch_related(
+            'books'))
+        with self.assertNumQueries(0):
+            data = simple_serialize(authors, relations=['books'])
+        self.assertEqual([item['books'] for item in data],
+                         self.get_expected_books())
+        books = list(Book.objects.order_by('pk').prefetch_related('tags'))
+        with self.assertNumQueries(0):
+            data = simple_serialize(books)
+        self.assertEqual(data, reference_serialize(books))
+
+    def test_prefetched_queryset(self):
+        queryset = Book.objects.order_by('pk').prefetch_related('tags')
+        with self.assertNumQueries(2):
+            data = simple_serialize(queryset)
+        self.assertEqual(data, reference_serialize(Book.objects.order_by(
+            'pk')))
+
+    def test_chunks(self):
+        queryset = Author.objects.order_by('pk')
+        # one query of rows and one query of relations per chunk
+        with self.assertNumQueries(4):
+            chunks = list(iter_serialize(queryset, chunk_size=1,
+                                         relations=['books']))
+        self.assertEqual([item['books'] for chunk in chunks
+                          for item in chunk], self.get_expected_books())
+
+
+class SerializationPlanCacheTestCase(TestCase):
+
+    def test_fields_order(self):
+        plan = get_serialization_plan(Book, ['title', 'author__name', 'price',
+                                             'author__kind'])
+        self.assertIs(get_serialization_plan(
+            Book, ['author__kind', 'price', 'author__name', 'title']), plan)
+        self.assertIs(get_serialization_plan(
+            Book, ('title', 'title', 'price', 'author__kind',
+                   'author__name')), plan)
+        self.assertEqual(plan.names, ['title', 'price', 'author__kind',
+                                      'author__name'])
+        self.assertIsNot(get_serialization_plan(Book, ['title']), plan)
+        self.assertIsNot(get_serialization_plan(Book), plan)
+        self.assertIsNot(get_serialization_plan(Book, []), plan)